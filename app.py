@@ -1,51 +1,63 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, abort
+from flask import Flask, render_template, stream_template, request, redirect, url_for, flash, session, send_file, abort, jsonify
+from flask.helpers import get_debug_flag
+from werkzeug.serving import is_running_from_reloader
 import csv
 import os
 from datetime import datetime, time, timedelta
 import pytz
 import pandas as pd  # For exporting to Excel
+import numpy as np
+import click
 import requests  # For fetching time from external API
 from functools import wraps
 from dotenv import load_dotenv
+import io
 from io import BytesIO
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill
+import itertools
+import zlib
 import logging
 import shutil  # Added for backup
 import uuid
 import json
+import re
+import bisect
+import sqlite3
+import threading
+import queue
+from time import monotonic, sleep
+from collections import Counter, namedtuple, OrderedDict
+import hashlib
+import heapq
+from types import MappingProxyType
+from concurrent.futures import Future, ThreadPoolExecutor
 
 def purge_duplicate_actions():
     """
-    Purges duplicate Time-In and Time-Out actions in the log.csv file,
+    Purges duplicate Time-In and Time-Out actions in the attendance log,
     keeping only the first occurrence for each user per date.
     """
-    if not os.path.isfile(LOG_FILE):
+    if not storage.has_log():
         app.logger.warning("Log file does not exist. No duplicates to purge.")
         return False, "Log file does not exist. No duplicates to purge."
 
     try:
-        # Backup the original log file before making changes
-        backup_file = LOG_FILE + ".backup"
-        shutil.copy(LOG_FILE, backup_file)
-        app.logger.info(f"Backup of log file created at {backup_file}.")
-
-        # Read the log CSV into a DataFrame
-        df = pd.read_csv(LOG_FILE, encoding='utf-8')
-
-        # Sort by ID ascending to keep the first occurrence
-        df_sorted = df.sort_values(by='ID', ascending=True)
-
-        # Drop duplicates based on Name, Date, and Action, keeping the first occurrence
-        df_cleaned = df_sorted.drop_duplicates(subset=['Name', 'Date', 'Action'], keep='first')
-
-        # Check if any duplicates were removed
-        duplicates_removed = len(df_sorted) - len(df_cleaned)
-        if duplicates_removed == 0:
-            app.logger.info("No duplicate actions found in the log file.")
-            return False, "No duplicate actions found in the log file."
-
-        # Save the cleaned DataFrame back to the CSV
-        df_cleaned.to_csv(LOG_FILE, index=False, quoting=csv.QUOTE_ALL)
+        with _log_write_lock:
+            # Purging can remove the newest rows, so keep their IDs reserved
+            persist_log_id_high_water_mark()
+            duplicates_removed = storage.purge_duplicate_actions()
+
+            # Check if any duplicates were removed
+            if duplicates_removed == 0:
+                app.logger.info("No duplicate actions found in the log file.")
+                return False, "No duplicate actions found in the log file."
+
+            rebuild_attendance_index()
+            invalidate_daily_summaries()
+            live_dashboard.invalidate()
+            bump_log_generation()
         app.logger.info(f"Purged {duplicates_removed} duplicate actions from the log file.")
         return True, f"Purged {duplicates_removed} duplicate actions from the log file."
     except Exception as e:
@@ -79,7 +91,7 @@ app.config.update(
 # Define Pakistan time zone
 LOCAL_TIME_ZONE = pytz.timezone('Asia/Karachi')  # Use Pakistan time zone
 
-# Configurable shift times
+# Configurable shift times (defaults; shift_times.csv may override them)
 SHIFT_START = time(6, 0)       # 6:00 AM
 SHIFT_END = time(11, 59)       # 11:59 AM
 EXPECTED_TIME_IN = time(8, 0)  # 8:00 AM
@@ -89,11 +101,67 @@ PM_SHIFT_START = time(18, 0)   # 6:00 PM
 PM_SHIFT_END = time(23, 59)    # 11:59 PM
 PM_EXPECTED_TIME_IN = time(20, 0)  # 8:00 PM
 
+# Reference clock syncing: interval, failures before the circuit breaker opens, and its cooldown
+CLOCK_SYNC_INTERVAL = float(os.getenv('CLOCK_SYNC_INTERVAL', 600))        # seconds
+CLOCK_FAILURE_THRESHOLD = int(os.getenv('CLOCK_FAILURE_THRESHOLD', 3))
+CLOCK_BREAKER_COOLDOWN = float(os.getenv('CLOCK_BREAKER_COOLDOWN', 900))   # seconds
+
 # Path to the m_credential CSV and log CSV
 m_credential_FILE = os.path.join(BASE_DIR, 'm_credential.csv')
 LOG_FILE = os.path.join(BASE_DIR, 'log.csv')
-
-# Define time limits for actions
+AMENDMENTS_FILE = os.path.join(BASE_DIR, 'log_amendments.csv')
+
+# Day partitions of the attendance log (CSV backend); log.csv is migrated into them on first use
+LOG_PARTITION_DIR = os.path.join(BASE_DIR, 'log_partitions')
+LOG_PARTITION_KEY = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+UNDATED_PARTITION = 'undated'
+
+# Group commit of log writes: batching window, fsync after each batch, and how long a request waits
+LOG_WRITE_INTERVAL = float(os.getenv('LOG_WRITE_INTERVAL', 0.005))    # seconds
+LOG_WRITE_FSYNC = os.getenv('LOG_WRITE_FSYNC', 'false').lower() == 'true'
+LOG_WRITE_TIMEOUT = float(os.getenv('LOG_WRITE_TIMEOUT', 10))         # seconds
+
+# Columnar archive of closed-out months (CSV backend), written by `flask archive-log`
+LOG_ARCHIVE_DIR = os.path.join(BASE_DIR, 'log_archive')
+
+# Days of history loaded into the in-memory attendance index
+ATTENDANCE_INDEX_DAYS = int(os.getenv('ATTENDANCE_INDEX_DAYS', 2))
+
+# Columns shown in reports, the integer-second column stored with each display duration,
+# the columns of log.csv, and the subset that closing a record may amend
+REPORT_FIELDNAMES = ['ID', 'Employee ID', 'Name', 'Group', 'Action', 'Date',
+                     'Start Time', 'End Time', 'Time Consumed', 'Shift',
+                     'Lateness Duration', 'Status']
+DURATION_SECONDS_COLUMNS = {'Time Consumed': 'Consumed Seconds', 'Lateness Duration': 'Lateness Seconds'}
+LOG_FIELDNAMES = REPORT_FIELDNAMES + list(DURATION_SECONDS_COLUMNS.values())
+AMENDMENT_FIELDNAMES = ['ID', 'Action', 'End Time', 'Time Consumed', 'Lateness Duration', 'Status',
+                        'Consumed Seconds', 'Lateness Seconds']
+
+# Typed log frames: low-cardinality text as categoricals, IDs and seconds as small nullable
+# integers, and the memory cap of the per-generation cache of parsed frames
+LOG_CATEGORY_COLUMNS = ['Name', 'Group', 'Action', 'Shift', 'Status']
+LOG_INTEGER_DTYPES = {'ID': 'Int64', 'Employee ID': 'Int32', 'Consumed Seconds': 'Int32', 'Lateness Seconds': 'Int32'}
+LOG_FRAME_CACHE_MAX_BYTES = int(os.getenv('LOG_FRAME_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+
+# Background back-fill of the integer-second columns: rows per chunk and pause between chunks
+DURATION_MIGRATION_CHUNK_ROWS = int(os.getenv('DURATION_MIGRATION_CHUNK_ROWS', 5000))
+DURATION_MIGRATION_PAUSE = float(os.getenv('DURATION_MIGRATION_PAUSE', 0.05))  # seconds
+
+# Storage backend for attendance records, employees and credentials: 'csv' or 'sqlite'
+# The log ID counter, attendance index, open breaks and caches live in process
+# memory, so the app must be served by a single process (threads are fine, e.g.
+# `gunicorn -w 1 --threads 8 app:app` without --preload, or waitress). The
+# serving process and the CLI commands that write the log hold INSTANCE_LOCK_FILE,
+# so a second one refuses to start instead of handing out the same log IDs.
+INSTANCE_LOCK_FILE = os.path.join(BASE_DIR, 'attendance.lock')
+app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'csv').lower()
+app.config['SQLITE_DATABASE'] = os.getenv('SQLITE_DATABASE', os.path.join(BASE_DIR, 'attendance.db'))
+
+# Background compaction of amendments into log.csv
+LOG_COMPACTION_INTERVAL = int(os.getenv('LOG_COMPACTION_INTERVAL', 300))    # seconds
+LOG_COMPACTION_THRESHOLD = int(os.getenv('LOG_COMPACTION_THRESHOLD', 500))  # amendments
+
+# Define time limits for actions (defaults; break_limits.csv overrides them once an admin saves it)
 TIME_LIMITS = {
     "Recite Sutra": 30,
     "Toilet": 20,
@@ -102,59 +170,1822 @@ TIME_LIMITS = {
     "BREAK2": 45,
 }
 
+# Memory cap of the generation-keyed cache of report and export responses
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Rows per chunk when streaming the log into an Excel export
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', 5000))
+
+# Background export jobs: worker threads, where finished workbooks are kept, and for how long
+EXPORT_JOB_WORKERS = int(os.getenv('EXPORT_JOB_WORKERS', 2))
+EXPORT_JOB_DIR = os.path.join(BASE_DIR, 'export_jobs')
+EXPORT_JOB_TTL = int(os.getenv('EXPORT_JOB_TTL', 3600))  # seconds
+EXPORT_JOB_SWEEP_INTERVAL = float(os.getenv('EXPORT_JOB_SWEEP_INTERVAL', 60))  # seconds
+
+# Active breaks: crash-recovery snapshot, the legacy per-break files it replaces,
+# how often it is written, and how long a break may stay open before it is flagged
+ACTIVE_BREAKS_FILE = os.path.join(BASE_DIR, 'active_breaks.json')
+LEGACY_BREAK_DIR = os.path.join(BASE_DIR, 'temp')
+BREAK_SNAPSHOT_INTERVAL = float(os.getenv('BREAK_SNAPSHOT_INTERVAL', 5))   # seconds
+BREAK_TTL = int(os.getenv('BREAK_TTL', 12 * 3600))                          # seconds
+
+# Overbreak timers: optional URL that receives a JSON POST when a break passes its
+# limit, and the longest the timer thread sleeps before reading the clock again
+OVERBREAK_WEBHOOK_URL = os.getenv('OVERBREAK_WEBHOOK_URL', '')
+OVERBREAK_MAX_WAIT = float(os.getenv('OVERBREAK_MAX_WAIT', 30))  # seconds
+
+# Live dashboard: how often viewers get a refreshed state without any punch,
+# and how often an idle event stream sends a keep-alive comment
+DASHBOARD_TICK_INTERVAL = float(os.getenv('DASHBOARD_TICK_INTERVAL', 30))  # seconds
+DASHBOARD_KEEPALIVE = float(os.getenv('DASHBOARD_KEEPALIVE', 15))          # seconds
+
+# Reference data files watched by the registry, and how often they are checked for changes
+GROUPS_FILE = os.path.join(BASE_DIR, 'groups.csv')
+BREAK_LIMITS_FILE = os.path.join(BASE_DIR, 'break_limits.csv')
+SHIFT_TIMES_FILE = os.path.join(BASE_DIR, 'shift_times.csv')
+SHIFT_POLICIES_FILE = os.path.join(BASE_DIR, 'shift_policies.json')
+REFERENCE_DATA_POLL_INTERVAL = float(os.getenv('REFERENCE_DATA_POLL_INTERVAL', 5))  # seconds
+
+
+# Storage backends.
+# Every read and write of attendance records, employees and credentials goes
+# through the `storage` object below. The CSV backend keeps the original file
+# formats; the SQLite backend stores the same data in one WAL-mode database.
+# Callers that write the log hold _log_write_lock, so backends do not lock.
+# Readers only hold it long enough to pin a view of the log (log_view()) and
+# then parse it without blocking writers.
+class StaleLogView(Exception):
+    """Raised when a log view was invalidated by a rewrite before it could be read."""
+
+
+class StorageBackend:
+    """Interface implemented by the storage backends."""
+
+    def has_log(self):
+        """Returns True if any attendance data has been stored."""
+        raise NotImplementedError
+
+    def last_log_id(self):
+        """Returns the highest log ID ever issued, or 0."""
+        raise NotImplementedError
+
+    def save_last_log_id(self, last_id):
+        """Persists the highest issued log ID."""
+        raise NotImplementedError
+
+    def append_log(self, data):
+        """Appends a single attendance record."""
+        raise NotImplementedError
+
+    def amend_log(self, log_id, changes, date_str):
+        """Sets the non-empty amendable fields in `changes` on an existing record dated `date_str`."""
+        raise NotImplementedError
+
+    def log_record_date(self, log_id):
+        """Returns the Date of a record that can still be amended, or None if there is none."""
+        raise NotImplementedError
+
+    def write_batch(self, operations):
+        """
+        Applies a batch of ('append', data) and ('amend', log_id, changes, date_str)
+        operations. Backends override this to write the whole batch at once.
+        """
+        for operation in operations:
+            if operation[0] == 'append':
+                self.append_log(operation[1])
+            else:
+                self.amend_log(*operation[1:])
+
+    def log_view(self, start_date=None, end_date=None):
+        """
+        Pins the log as it is now for a later read_log_frame(view=...) that runs without
+        _log_write_lock. Called under _log_write_lock; returns None if reads cannot be pinned.
+        """
+        return None
+
+    def read_log_frame(self, start_date=None, end_date=None, columns=None, view=None):
+        """
+        Returns the attendance records in an inclusive date range as a DataFrame with the
+        log.csv columns, or only the listed ones; storage reads just what they need.
+        With a view from log_view() the read sees the log exactly as it was pinned, or
+        raises StaleLogView if a rewrite got in the way.
+        """
+        raise NotImplementedError
+
+    def iter_log_records(self, start_date=None, end_date=None, newest_first=False,
+                         employee_id=None, group=None, actions=None):
+        """
+        Yields the attendance records in an inclusive date range as dicts keyed by the log.csv column names.
+        newest_first reverses the order while still holding at most one partition in memory.
+        employee_id (int), group (case-insensitive) and actions (a set) are filters applied while reading.
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        """Folds any pending write-side state into the base storage; returns the work done."""
+        return 0
+
+    def purge_duplicate_actions(self, start_date=None, end_date=None):
+        """Backs up the log, removes duplicate (Name, Date, Action) rows and returns how many were removed."""
+        raise NotImplementedError
+
+    def archive_month(self, month):
+        """Freezes a closed 'YYYY-MM' month into read-only storage; returns the number of rows archived."""
+        raise NotImplementedError(f"{type(self).__name__} does not support archiving")
+
+    def backfill_duration_seconds(self, limit):
+        """
+        Fills the integer-second columns of stored rows that only have display durations.
+        Works through about `limit` rows per call; returns the rows handled, 0 once done.
+        """
+        return 0
+
+    def read_employees(self):
+        raise NotImplementedError
+
+    def employees_version(self):
+        """Returns a token that changes whenever the stored roster changes."""
+        raise NotImplementedError
+
+    def append_employee(self, employee):
+        raise NotImplementedError
+
+    def write_employees(self, employee_list):
+        raise NotImplementedError
+
+    def read_keys(self):
+        raise NotImplementedError
+
+    def keys_version(self):
+        """Returns a token that changes whenever the stored keys change."""
+        raise NotImplementedError
+
+    def write_keys(self, master_key, sub_keys):
+        raise NotImplementedError
+
+
+def _file_version(path):
+    """Returns (mtime, size) of a file as a change token, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
 
-def get_employee_list():
-    """Reads the employee list from employees.csv and returns a list of dictionaries."""
-    employee_list = []
-    if os.path.isfile(EMPLOYEES_FILE):
+
+def _file_size(path):
+    """Returns the size of a file, or None if it does not exist."""
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return None
+
+
+def _read_prefix(path, size):
+    """Reads the first `size` bytes of a file into memory, as a pandas-readable buffer."""
+    with open(path, 'rb') as source:
+        return BytesIO(source.read(size))
+
+
+def _read_max_log_id(log_file):
+    """
+    Returns the highest record ID in a log CSV, or 0. IDs are issued before the
+    queued append, so concurrent punches can reach the file out of ID order and
+    the last line does not necessarily hold the highest ID.
+    """
+    if not os.path.isfile(log_file):
+        return 0
+    max_id = 0
+    with open(log_file, 'r', newline='', encoding='utf-8', errors='replace') as logfile:
+        for row in csv.reader(logfile):
+            if row and row[0].isdigit():
+                max_id = max(max_id, int(row[0]))
+    return max_id
+
+
+def _read_csv_amendments(amendments_file):
+    """Reads an amendments CSV into {log ID: {field: latest non-empty value}}."""
+    amendments = {}
+    if os.path.isfile(amendments_file):
+        with open(amendments_file, 'r', newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if row.get('ID', '').isdigit():
+                    changes = amendments.setdefault(int(row['ID']), {})
+                    changes.update({field: value for field, value in row.items()
+                                    if field != 'ID' and value != ''})
+    return amendments
+
+
+# Columnar archive of closed-out months.
+# Each archived month is a directory of .npy arrays, one per column, plus
+# dictionaries.json. Times and durations are fixed-width integer arrays
+# (seconds, -1 for empty), the date is days since 1970-01-01, and text columns
+# are stored as integer codes into a per-month dictionary. Arrays are opened
+# with numpy memory mapping, so reading a month needs no text parsing.
+ARCHIVE_INTEGER_COLUMNS = {
+    'ID': ('id', np.int64),
+    'Employee ID': ('employee_id', np.int32),
+    'Date': ('date', np.int32),
+    'Start Time': ('start_time', np.int32),
+    'End Time': ('end_time', np.int32),
+    'Time Consumed': ('duration_seconds', np.int32),
+    'Lateness Duration': ('lateness_seconds', np.int32),
+}
+ARCHIVE_DICTIONARY_COLUMNS = {
+    'Name': 'name',
+    'Group': 'group',
+    'Action': 'action',
+    'Shift': 'shift',
+    'Status': 'status',
+    'Time Consumed': 'time_consumed',
+    'Lateness Duration': 'lateness_duration',
+}
+
+
+def parse_duration_seconds(values):
+    """Converts display durations such as '1 hrs & 5 mins & 3 secs' to integer seconds (-1 when empty)."""
+    text = pd.Series(values, dtype=object).fillna('').astype(str)
+    seconds = pd.Series(0, index=text.index, dtype='int64')
+    for unit, factor in (('hrs', 3600), ('mins', 60), ('secs', 1)):
+        seconds += pd.to_numeric(text.str.extract(rf'(\d+)\s*{unit}', expand=False), errors='coerce').fillna(0).astype('int64') * factor
+    return seconds.where(text.str.strip() != '', -1)
+
+
+_DURATION_PART = re.compile(r'(\d+)\s*(hrs|mins|secs)')
+_DURATION_FACTORS = {'hrs': 3600, 'mins': 60, 'secs': 1}
+
+
+def _duration_seconds(text):
+    """Converts one display duration such as '1 hrs & 5 mins' to seconds (0 when empty)."""
+    return sum(int(number) * _DURATION_FACTORS[unit] for number, unit in _DURATION_PART.findall(_clean_log_value(text)))
+
+
+def log_projection(columns):
+    """
+    Returns the stored columns needed to build `columns` of the log: the ID,
+    for folding amendments, and the display duration behind each seconds column.
+    """
+    if columns is None:
+        return list(LOG_FIELDNAMES)
+    needed = {'ID', *columns} | {display for display, column in DURATION_SECONDS_COLUMNS.items() if column in columns}
+    return [column for column in LOG_FIELDNAMES if column in needed]
+
+
+def fill_duration_seconds(df):
+    """
+    Adds the integer-second columns to a log DataFrame as nullable integers,
+    deriving any missing value from its display duration.
+    """
+    for display, column in DURATION_SECONDS_COLUMNS.items():
+        if display not in df:
+            continue
+        if column in df:
+            seconds = pd.to_numeric(df[column], errors='coerce').astype('float64')
+        else:
+            seconds = pd.Series(np.nan, index=df.index)
+        missing = seconds.isna() & df[display].notna()
+        if missing.any():
+            parsed = parse_duration_seconds(df.loc[missing, display])
+            seconds[missing] = parsed.where(parsed >= 0)
+        df[column] = seconds.astype('Int64')
+    return df
+
+
+def fill_record_seconds(record):
+    """Sets a missing integer-second field of a log record dict from its display duration."""
+    for display, column in DURATION_SECONDS_COLUMNS.items():
+        if _clean_log_value(record.get(column)) == '' and _clean_log_value(record.get(display)) != '':
+            record[column] = _duration_seconds(record[display])
+    return record
+
+
+def format_duration(seconds):
+    """Formats whole seconds for display, e.g. '1 hrs & 5 mins & 3 secs' ('0 secs' when zero)."""
+    hours, remaining = divmod(int(seconds), 3600)
+    minutes, secs = divmod(remaining, 60)
+    parts = []
+    if hours > 0:
+        parts.append(f"{hours} hrs")
+    if minutes > 0:
+        parts.append(f"{minutes} mins")
+    if secs > 0:
+        parts.append(f"{secs} secs")
+    return ' & '.join(parts) if parts else '0 secs'
+
+
+def parse_clock_seconds(values):
+    """Converts 'HH:MM:SS' strings to seconds since midnight (-1 when empty or invalid)."""
+    parts = pd.Series(values, dtype=object).fillna('').astype(str).str.strip().str.split(':', expand=True)
+    if parts.shape[1] < 3:
+        return pd.Series(-1, index=parts.index, dtype='int64')
+    numbers = parts.iloc[:, :3].apply(pd.to_numeric, errors='coerce')
+    seconds = numbers[0] * 3600 + numbers[1] * 60 + numbers[2]
+    return seconds.fillna(-1).astype('int64')
+
+
+def write_log_archive(df, archive_dir):
+    """Writes a log DataFrame as a columnar archive into archive_dir (which must not exist)."""
+    tmp_dir = archive_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    df = fill_duration_seconds(df.copy())
+    columns = {
+        'ID': pd.to_numeric(df['ID'], errors='coerce').fillna(-1),
+        'Employee ID': pd.to_numeric(df['Employee ID'], errors='coerce').fillna(-1),
+        'Date': ((pd.to_datetime(df['Date'], errors='coerce') - pd.Timestamp('1970-01-01')).dt.days).fillna(-1),
+        'Start Time': parse_clock_seconds(df['Start Time']),
+        'End Time': parse_clock_seconds(df['End Time']),
+        'Time Consumed': df['Consumed Seconds'].fillna(-1),
+        'Lateness Duration': df['Lateness Seconds'].fillna(-1),
+    }
+    for column, (name, dtype) in ARCHIVE_INTEGER_COLUMNS.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.asarray(columns[column], dtype=dtype))
+    dictionaries = {}
+    for column, name in ARCHIVE_DICTIONARY_COLUMNS.items():
+        codes, uniques = pd.factorize(df[column].fillna('').astype(str), sort=True)
+        dtype = np.int16 if len(uniques) < np.iinfo(np.int16).max else np.int32
+        np.save(os.path.join(tmp_dir, f'{name}.codes.npy'), codes.astype(dtype))
+        dictionaries[name] = list(uniques)
+    with open(os.path.join(tmp_dir, 'dictionaries.json'), 'w', encoding='utf-8') as dictionary_file:
+        json.dump({'rows': len(df), 'dictionaries': dictionaries}, dictionary_file)
+    os.replace(tmp_dir, archive_dir)
+
+
+def load_log_archive(archive_dir):
+    """
+    Opens an archived month without copying: returns ({array name: numpy.memmap}, {column name: dictionary}).
+    Dictionary-encoded columns are under '<name>.codes'.
+    """
+    with open(os.path.join(archive_dir, 'dictionaries.json'), 'r', encoding='utf-8') as dictionary_file:
+        dictionaries = json.load(dictionary_file)['dictionaries']
+    arrays = {}
+    for name, _ in ARCHIVE_INTEGER_COLUMNS.values():
+        arrays[name] = np.load(os.path.join(archive_dir, f'{name}.npy'), mmap_mode='r')
+    for name in ARCHIVE_DICTIONARY_COLUMNS.values():
+        arrays[f'{name}.codes'] = np.load(os.path.join(archive_dir, f'{name}.codes.npy'), mmap_mode='r')
+    return arrays, dictionaries
+
+
+def _format_clock_seconds(seconds):
+    seconds = pd.Series(seconds)
+    text = pd.to_datetime(seconds.clip(lower=0), unit='s').dt.strftime('%H:%M:%S')
+    return text.where(seconds >= 0, '')
+
+
+def read_log_archive_frame(archive_dir, start_date=None, end_date=None, employee_id=None, group=None, actions=None,
+                           columns=None):
+    """
+    Materializes an archived month as a log DataFrame, with every column or only the listed ones.
+    The optional date range, employee, group and action filters are evaluated on the
+    memory-mapped columns before any row is built.
+    """
+    arrays, dictionaries = load_log_archive(archive_dir)
+    days = arrays['date']
+    mask = np.ones(len(days), dtype=bool)
+    epoch = pd.Timestamp('1970-01-01')
+    if start_date:
+        mask &= days >= (pd.Timestamp(start_date) - epoch).days
+    if end_date:
+        mask &= days <= (pd.Timestamp(end_date) - epoch).days
+    if employee_id is not None:
+        mask &= arrays['employee_id'] == int(employee_id)
+    if group is not None:
+        codes = [code for code, value in enumerate(dictionaries['group']) if str(value).strip().upper() == group.strip().upper()]
+        mask &= np.isin(arrays['group.codes'], codes)
+    if actions is not None:
+        codes = [code for code, value in enumerate(dictionaries['action']) if value in actions]
+        mask &= np.isin(arrays['action.codes'], codes)
+    columns = columns or LOG_FIELDNAMES
+    frame = {}
+    if 'ID' in columns:
+        frame['ID'] = np.asarray(arrays['id'][mask])
+    if 'Employee ID' in columns:
+        frame['Employee ID'] = np.asarray(arrays['employee_id'][mask])
+    if 'Date' in columns:
+        dates = pd.Series(pd.to_datetime(np.asarray(days[mask], dtype='int64'), unit='D').strftime('%Y-%m-%d'))
+        frame['Date'] = dates.where(np.asarray(days[mask]) >= 0, '')
+    for column, name in (('Start Time', 'start_time'), ('End Time', 'end_time')):
+        if column in columns:
+            frame[column] = _format_clock_seconds(arrays[name][mask])
+    for column, name in ARCHIVE_DICTIONARY_COLUMNS.items():
+        if column in columns:
+            categories = np.asarray(dictionaries[name], dtype=object)
+            frame[column] = categories[np.asarray(arrays[f'{name}.codes'][mask])]
+    df = pd.DataFrame({column: np.asarray(frame[column]) for column in REPORT_FIELDNAMES if column in columns})
+    df = df.replace('', np.nan)
+    for column, name in (('Consumed Seconds', 'duration_seconds'), ('Lateness Seconds', 'lateness_seconds')):
+        if column in columns:
+            seconds = pd.Series(np.asarray(arrays[name][mask], dtype='int64'))
+            df[column] = seconds.where(seconds >= 0).astype('Int64')
+    return df[list(columns)]
+
+
+class CsvStorage(StorageBackend):
+    """
+    Stores the attendance log as one CSV file per day under log_partitions/,
+    and employees and credentials in employees.csv and m_credential.csv.
+
+    manifest.json lists the day partitions, and the months frozen into the
+    columnar archive, so that date-range reads open only the files they need.
+    IDs stay global across partitions. An existing single-file log.csv is
+    split into partitions on first use.
+    """
+
+    def __init__(self, partition_dir, archive_dir, legacy_log_file, legacy_amendments_file, employees_file, credentials_file):
+        self.partition_dir = partition_dir
+        self.archive_dir = archive_dir
+        self.manifest_file = os.path.join(partition_dir, 'manifest.json')
+        self.log_id_file = os.path.join(partition_dir, 'last_log_id')
+        self.backup_dir = os.path.join(partition_dir, 'backup')
+        self.legacy_log_file = legacy_log_file
+        self.legacy_amendments_file = legacy_amendments_file
+        self.employees_file = employees_file
+        self.credentials_file = credentials_file
+        self._partition_lock = threading.RLock()
+        self._partitions = None           # sorted partition keys, loaded from the manifest
+        self._archived_months = []        # sorted 'YYYY-MM' keys of archived months
+        self._dirty_partitions = set()    # partitions with pending amendments
+        self._rewrites = 0                # bumped whenever a partition or amendments file is replaced or removed
+
+    def _partition_key(self, date_str):
+        date_str = _clean_log_value(date_str)
+        return date_str if LOG_PARTITION_KEY.match(date_str) else UNDATED_PARTITION
+
+    def _partition_file(self, key):
+        return os.path.join(self.partition_dir, f'{key}.csv')
+
+    def _amendments_file(self, key):
+        return os.path.join(self.partition_dir, f'{key}.amend.csv')
+
+    def _load_manifest(self):
+        """Returns the sorted list of partition keys, migrating a legacy log.csv first if needed."""
+        with self._partition_lock:
+            if self._partitions is None:
+                os.makedirs(self.partition_dir, exist_ok=True)
+                if os.path.isfile(self.manifest_file):
+                    with open(self.manifest_file, 'r', encoding='utf-8') as manifest:
+                        contents = json.load(manifest)
+                    self._partitions = sorted(contents['partitions'])
+                    self._archived_months = sorted(contents.get('archived_months', []))
+                else:
+                    self._partitions = []
+                    self._migrate_legacy_log()
+                self._dirty_partitions = {key for key in self._partitions
+                                          if os.path.isfile(self._amendments_file(key))}
+            return self._partitions
+
+    def _save_manifest(self):
+        tmp_file = self.manifest_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as manifest:
+            json.dump({'partitions': self._partitions, 'archived_months': self._archived_months}, manifest, indent=1)
+        os.replace(tmp_file, self.manifest_file)
+
+    def is_partitioned(self):
+        """Returns True once the log has been split into day partitions."""
+        return os.path.isfile(self.manifest_file)
+
+    def iter_legacy_log_records(self):
+        """Yields the rows of a not yet partitioned log.csv with its amendments applied, leaving the files in place."""
+        if not os.path.isfile(self.legacy_log_file):
+            return
+        amendments = _read_csv_amendments(self.legacy_amendments_file)
+        with open(self.legacy_log_file, 'r', newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if row.get('ID', '').isdigit() and int(row['ID']) in amendments:
+                    row.update(amendments[int(row['ID'])])
+                yield fill_record_seconds(row)
+
+    def legacy_last_log_id(self):
+        """Returns the highest log ID issued while the log was a single log.csv."""
+        return max(_read_max_log_id(self.legacy_log_file),
+                   self._read_persisted_log_id(self.legacy_log_file + '.lastid'))
+
+    def _migrate_legacy_log(self):
+        """Splits log.csv (with its pending amendments) into day partitions, once."""
+        if os.path.isfile(self.legacy_log_file):
+            rows_by_partition = {}
+            for row in self.iter_legacy_log_records():
+                rows_by_partition.setdefault(self._partition_key(row.get('Date')), []).append(row)
+            for key, rows in rows_by_partition.items():
+                with open(self._partition_file(key), 'w', newline='', encoding='utf-8') as csvfile:
+                    csvwriter = csv.DictWriter(csvfile, fieldnames=LOG_FIELDNAMES, quoting=csv.QUOTE_ALL,
+                                               extrasaction='ignore')
+                    csvwriter.writeheader()
+                    csvwriter.writerows(rows)
+            self.save_last_log_id(self.legacy_last_log_id())
+            os.replace(self.legacy_log_file, self.legacy_log_file + '.migrated')
+            if os.path.isfile(self.legacy_amendments_file):
+                os.replace(self.legacy_amendments_file, self.legacy_amendments_file + '.migrated')
+            self._partitions = sorted(rows_by_partition)
+            app.logger.info(f"Split {self.legacy_log_file} into {len(self._partitions)} day partitions.")
+        self._save_manifest()
+
+    def partitions(self, start_date=None, end_date=None):
+        """Returns the partition keys covering an inclusive date range; undated rows only without a range."""
+        keys = self._load_manifest()
+        if start_date is None and end_date is None:
+            return list(keys)
+        low = bisect.bisect_left(keys, start_date) if start_date else 0
+        high = bisect.bisect_right(keys, end_date) if end_date else len(keys)
+        return [key for key in keys[low:high] if key != UNDATED_PARTITION]
+
+    def archived_months(self, start_date=None, end_date=None):
+        """Returns the archived months that overlap an inclusive date range."""
+        self._load_manifest()
+        return [month for month in self._archived_months
+                if (not start_date or month >= start_date[:7]) and (not end_date or month <= end_date[:7])]
+
+    def _archive_path(self, month):
+        return os.path.join(self.archive_dir, month)
+
+    def has_log(self):
+        return bool(self._load_manifest() or self._archived_months)
+
+    def _read_persisted_log_id(self, log_id_file=None):
+        """Returns the high-water mark stored in the sidecar file, or 0."""
         try:
-            with open(EMPLOYEES_FILE, 'r', newline='', encoding='utf-8') as csvfile:
+            with open(log_id_file or self.log_id_file, 'r', encoding='utf-8') as idfile:
+                return int(idfile.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def last_log_id(self):
+        # IDs grow with time, so only the newest dated partitions need to be scanned
+        keys = self._load_manifest()
+        dated = [key for key in keys if key != UNDATED_PARTITION]
+        candidates = dated[-2:] + ([UNDATED_PARTITION] if UNDATED_PARTITION in keys else [])
+        return max([self._read_persisted_log_id()] +
+                   [_read_max_log_id(self._partition_file(key)) for key in candidates])
+
+    def save_last_log_id(self, last_id):
+        tmp_file = self.log_id_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as idfile:
+            idfile.write(str(last_id))
+        os.replace(tmp_file, self.log_id_file)
+
+    def append_log(self, data):
+        self.write_batch([('append', data)])
+
+    def amend_log(self, log_id, changes, date_str):
+        self.write_batch([('amend', log_id, changes, date_str)])
+
+    def _read_header(self, path):
+        """Returns the column names in the first line of a CSV file, or None if it does not exist."""
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+            return next(csv.reader(csvfile), [])
+
+    def _append_rows(self, path, fieldnames, rows):
+        """
+        Appends rows to a CSV file with a single write and flush. Rows follow the
+        file's own header, so files not yet back-filled keep their older columns.
+        """
+        buffer = io.StringIO()
+        header = self._read_header(path)
+        csvwriter = csv.DictWriter(buffer, fieldnames=header or fieldnames, quoting=csv.QUOTE_ALL,
+                                   extrasaction='ignore')
+        if header is None:
+            csvwriter.writeheader()
+        csvwriter.writerows(rows)
+        with open(path, 'a', newline='', encoding='utf-8') as csvfile:
+            csvfile.write(buffer.getvalue())
+            csvfile.flush()
+            if LOG_WRITE_FSYNC:
+                os.fsync(csvfile.fileno())
+
+    def log_record_date(self, log_id):
+        # IDs grow with time, so the newest partitions are searched first; archived months are read-only
+        target = str(int(log_id))
+        for key in reversed(self._load_manifest()):
+            with open(self._partition_file(key), 'r', newline='', encoding='utf-8') as csvfile:
+                csvreader = csv.reader(csvfile)
+                header = next(csvreader, [])
+                if 'Date' not in header:
+                    continue
+                date_index = header.index('Date')
+                for row in csvreader:
+                    if row and row[0] == target:
+                        return row[date_index]
+        return None
+
+    def _truncate(self, path, size):
+        """Cuts a file back to `size` bytes, or removes it if it did not exist (size None)."""
+        try:
+            if size is None:
+                if os.path.isfile(path):
+                    os.remove(path)
+            else:
+                with open(path, 'r+b') as csvfile:
+                    csvfile.truncate(size)
+        except OSError as e:
+            app.logger.error(f"Error rolling back {path}: {e}")
+
+    def write_batch(self, operations):
+        # Group rows by target file so each file gets one write per batch
+        appends, amendments = {}, {}
+        for operation in operations:
+            if operation[0] == 'append':
+                data = operation[1]
+                appends.setdefault(self._partition_key(data.get('Date')), []).append(data)
+            else:
+                # Appended as an amendment row; the compactor merges it into the partition later
+                _, log_id, changes, date_str = operation
+                amendment = {field: changes.get(field, '') for field in AMENDMENT_FIELDNAMES}
+                amendment['ID'] = log_id
+                amendments.setdefault(self._partition_key(date_str), []).append(amendment)
+        with self._partition_lock:
+            keys = self._load_manifest()
+            # The batch is all-or-nothing: if any file fails, every file written so far is
+            # cut back to its previous size, so the writer can safely retry operations one by one
+            written = []                  # (path, size before the batch or None if new)
+            new_keys = [key for key in appends if key not in keys]
+            try:
+                for key, rows in appends.items():
+                    path = self._partition_file(key)
+                    written.append((path, _file_size(path)))
+                    self._append_rows(path, LOG_FIELDNAMES, rows)
+                for key, rows in amendments.items():
+                    if key not in keys and key not in appends:
+                        raise LookupError(f"No log partition {key} holds log IDs {[row['ID'] for row in rows]}.")
+                    path = self._amendments_file(key)
+                    written.append((path, _file_size(path)))
+                    self._append_rows(path, AMENDMENT_FIELDNAMES, rows)
+                if new_keys:
+                    self._partitions = sorted(keys + new_keys)
+                    self._save_manifest()
+            except Exception:
+                self._partitions = keys
+                for path, size in reversed(written):
+                    self._truncate(path, size)
+                raise
+            self._dirty_partitions.update(amendments)
+        amendment_count = sum(len(rows) for rows in amendments.values())
+        if amendment_count:
+            _notify_compactor(amendment_count)
+
+    def _read_amendments(self, key, size=-1):
+        """
+        Reads a partition's pending amendments into a DataFrame of strings, or returns None.
+        A `size` limits the read to the start of the file; None skips the file.
+        """
+        amendments_file = self._amendments_file(key)
+        if size is None or not os.path.isfile(amendments_file):
+            return None
+        source = amendments_file if size < 0 else _read_prefix(amendments_file, size)
+        amendments = pd.read_csv(source, encoding='utf-8', dtype=str, keep_default_na=False)
+        if amendments.empty:
+            return None
+        amendments['ID'] = pd.to_numeric(amendments['ID'], errors='coerce')
+        return amendments.dropna(subset=['ID']).astype({'ID': 'int64'})
+
+    def _read_partition(self, key, columns=None, sizes=None):
+        # Text columns are declared as strings so pandas skips type inference on them.
+        # `sizes` (partition bytes, amendments bytes or None) limits the read to a pinned view.
+        stored = log_projection(columns)
+        source = self._partition_file(key) if sizes is None else _read_prefix(self._partition_file(key), sizes[0])
+        df = pd.read_csv(source, encoding='utf-8', usecols=lambda column: column in stored,
+                         dtype={column: str for column in stored if column not in LOG_INTEGER_DTYPES})
+        amendments = self._read_amendments(key) if sizes is None else self._read_amendments(key, sizes[1])
+        df = fill_duration_seconds(fold_amendments(df.reindex(columns=stored), amendments))
+        return df[list(columns or LOG_FIELDNAMES)]
+
+    def log_view(self, start_date=None, end_date=None):
+        # Between rewrites partitions and amendments only grow, so their current sizes pin the read
+        with self._partition_lock:
+            return (self._rewrites, self.archived_months(start_date, end_date),
+                    [(key, (os.path.getsize(self._partition_file(key)), _file_size(self._amendments_file(key))))
+                     for key in self.partitions(start_date, end_date)])
+
+    def read_log_frame(self, start_date=None, end_date=None, columns=None, view=None):
+        if view is None:
+            months = self.archived_months(start_date, end_date)
+            partitions = [(key, None) for key in self.partitions(start_date, end_date)]
+        else:
+            rewrites, months, partitions = view
+        try:
+            frames = [read_log_archive_frame(self._archive_path(month), start_date, end_date, columns=columns)
+                      for month in months]
+            frames += [self._read_partition(key, columns, sizes) for key, sizes in partitions]
+        except OSError as e:
+            if view is None or self._rewrites == rewrites:
+                raise
+            raise StaleLogView() from e
+        if view is not None and self._rewrites != rewrites:
+            raise StaleLogView()
+        if not frames:
+            return pd.DataFrame(columns=list(columns or LOG_FIELDNAMES))
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_log_records(self, start_date=None, end_date=None, newest_first=False,
+                         employee_id=None, group=None, actions=None):
+        filters = {'employee_id': employee_id, 'group': group, 'actions': actions}
+        if newest_first:
+            for key in reversed(self.partitions(start_date, end_date)):
+                yield from reversed(list(self._iter_partition(key, **filters)))
+            for month in reversed(self.archived_months(start_date, end_date)):
+                yield from reversed(self._archived_records(month, start_date, end_date, **filters))
+            return
+        for month in self.archived_months(start_date, end_date):
+            yield from self._archived_records(month, start_date, end_date, **filters)
+        for key in self.partitions(start_date, end_date):
+            yield from self._iter_partition(key, **filters)
+
+    def _archived_records(self, month, start_date, end_date, **filters):
+        archived = read_log_archive_frame(self._archive_path(month), start_date, end_date, **filters)
+        return archived.astype(object).where(archived.notna(), '').to_dict('records')
+
+    def _iter_partition(self, key, employee_id=None, group=None, actions=None):
+        amendments = _read_csv_amendments(self._amendments_file(key))
+        employee_text = None if employee_id is None else str(employee_id)
+        group_text = None if group is None else group.strip().upper()
+        with open(self._partition_file(key), 'r', newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                # Employee and group are never amended, so they are checked before merging amendments
+                if employee_text is not None and row.get('Employee ID', '').lstrip('0') != employee_text.lstrip('0'):
+                    continue
+                if group_text is not None and row.get('Group', '').strip().upper() != group_text:
+                    continue
+                if row.get('ID', '').isdigit() and int(row['ID']) in amendments:
+                    row.update(amendments[int(row['ID'])])
+                if actions is not None and row.get('Action') not in actions:
+                    continue
+                yield fill_record_seconds(row)
+
+    def _rewrite_partition(self, key):
+        """Rewrites a partition with its amendments folded in and the full column set; returns its row count."""
+        df = self._read_partition(key)
+        tmp_file = self._partition_file(key) + '.tmp'
+        df.to_csv(tmp_file, index=False, quoting=csv.QUOTE_ALL)
+        self._rewrites += 1
+        os.replace(tmp_file, self._partition_file(key))
+        if os.path.isfile(self._amendments_file(key)):
+            os.remove(self._amendments_file(key))
+        self._dirty_partitions.discard(key)
+        return len(df)
+
+    def _compact_partition(self, key):
+        if not os.path.isfile(self._partition_file(key)):
+            # Left behind by an amendment filed under the wrong date; kept on disk for inspection
+            app.logger.warning(f"Amendments for missing log partition {key} were not compacted.")
+            self._dirty_partitions.discard(key)
+            return 0
+        amendments = self._read_amendments(key)
+        if amendments is not None:
+            self._rewrite_partition(key)
+        if os.path.isfile(self._amendments_file(key)):
+            self._rewrites += 1
+            os.remove(self._amendments_file(key))
+        self._dirty_partitions.discard(key)
+        return 0 if amendments is None else len(amendments)
+
+    def compact(self):
+        with self._partition_lock:
+            self._load_manifest()
+            return sum(self._compact_partition(key) for key in sorted(self._dirty_partitions))
+
+    def backfill_duration_seconds(self, limit):
+        # A partition is rewritten with the full schema once its header lacks a second column;
+        # archived months already store durations as integers
+        handled = 0
+        with self._partition_lock:
+            for key in self._load_manifest():
+                if handled >= limit:
+                    break
+                header = self._read_header(self._partition_file(key)) or []
+                if all(column in header for column in DURATION_SECONDS_COLUMNS.values()):
+                    continue
+                handled += max(self._rewrite_partition(key), 1)
+        return handled
+
+    def archive_month(self, month):
+        """
+        Freezes every day partition of a 'YYYY-MM' month into the columnar
+        archive and removes the partitions. Returns the number of rows archived.
+        """
+        with self._partition_lock:
+            keys = [key for key in self.partitions(f'{month}-01', f'{month}-31')]
+            if not keys:
+                return 0
+            for key in keys:
+                if key in self._dirty_partitions:
+                    self._compact_partition(key)
+            frames = [self._read_partition(key) for key in keys]
+            if month in self._archived_months:
+                # Late rows for an already archived month are merged into a new archive
+                frames.insert(0, read_log_archive_frame(self._archive_path(month)))
+            df = pd.concat(frames, ignore_index=True).sort_values(by='ID', kind='stable')
+
+            # Keep the ID high-water mark in case the newest rows move to the archive
+            self.save_last_log_id(self.last_log_id())
+            os.makedirs(self.archive_dir, exist_ok=True)
+            archive_path = self._archive_path(month)
+            write_log_archive(df, archive_path + '.new')
+            self._rewrites += 1
+            shutil.rmtree(archive_path, ignore_errors=True)
+            os.replace(archive_path + '.new', archive_path)
+
+            if month not in self._archived_months:
+                bisect.insort(self._archived_months, month)
+            self._partitions = [key for key in self._partitions if key not in keys]
+            self._save_manifest()
+            for key in keys:
+                os.remove(self._partition_file(key))
+        app.logger.info(f"Archived {len(df)} log records for {month} from {len(keys)} partitions.")
+        return len(df)
+
+    def purge_duplicate_actions(self, start_date=None, end_date=None):
+        # (Name, Date, Action) never spans two day partitions, so each partition is purged on its own.
+        # Archived months are closed and are not purged.
+        duplicates_removed = 0
+        with self._partition_lock:
+            for key in self.partitions(start_date, end_date):
+                # Merge pending amendments so the rewrite below starts from the complete partition
+                if key in self._dirty_partitions:
+                    self._compact_partition(key)
+
+                # Read the partition CSV into a DataFrame
+                df = self._read_partition(key)
+
+                # Sort by ID ascending to keep the first occurrence
+                df_sorted = df.sort_values(by='ID', ascending=True)
+
+                # Drop duplicates based on Name, Date, and Action, keeping the first occurrence
+                df_cleaned = df_sorted.drop_duplicates(subset=['Name', 'Date', 'Action'], keep='first')
+                removed = len(df_sorted) - len(df_cleaned)
+                if not removed:
+                    continue
+
+                # Backup the original partition before making changes
+                os.makedirs(self.backup_dir, exist_ok=True)
+                backup_file = os.path.join(self.backup_dir, f'{key}.csv')
+                shutil.copy(self._partition_file(key), backup_file)
+                app.logger.info(f"Backup of log partition {key} created at {backup_file}.")
+
+                # Save the cleaned DataFrame, swapping it in only once it is fully written
+                tmp_file = self._partition_file(key) + '.tmp'
+                df_cleaned.to_csv(tmp_file, index=False, quoting=csv.QUOTE_ALL)
+                self._rewrites += 1
+                os.replace(tmp_file, self._partition_file(key))
+                duplicates_removed += removed
+        return duplicates_removed
+
+    def read_employees(self):
+        employee_list = []
+        if os.path.isfile(self.employees_file):
+            with open(self.employees_file, 'r', newline='', encoding='utf-8') as csvfile:
                 csvreader = csv.DictReader(csvfile)
                 for row in csvreader:
                     # Ensure that 'ID' is treated as a string
                     employee_list.append({'ID': row['ID'].zfill(4), 'Name': row['Name']})
+        else:
+            app.logger.warning("Employee list file does not exist.")
+        return employee_list
+
+    def employees_version(self):
+        return _file_version(self.employees_file)
+
+    def append_employee(self, employee):
+        with open(self.employees_file, 'a', newline='', encoding='utf-8') as csvfile:
+            fieldnames = ['ID', 'Name']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            # Write header if the file is empty
+            if os.stat(self.employees_file).st_size == 0:
+                writer.writeheader()
+            writer.writerow(employee)
+
+    def write_employees(self, employee_list):
+        with open(self.employees_file, 'w', newline='', encoding='utf-8') as csvfile:
+            fieldnames = ['ID', 'Name']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(employee_list)
+
+    def read_keys(self):
+        if os.path.isfile(self.credentials_file):
+            with open(self.credentials_file, 'r', newline='', encoding='utf-8') as csvfile:
+                csvreader = csv.reader(csvfile)
+                headers = next(csvreader, None)  # Skip header
+                for row in csvreader:
+                    if row:
+                        master_key = row[0].strip()
+                        sub_keys = [key.strip() for key in row[1:]]  # Get all the sub-keys
+                        return master_key, sub_keys
+        return None, []
+
+    def keys_version(self):
+        return _file_version(self.credentials_file)
+
+    def write_keys(self, master_key, sub_keys):
+        with open(self.credentials_file, 'w', newline='', encoding='utf-8') as csvfile:
+            csvwriter = csv.writer(csvfile)
+            headers = ['master_key'] + [f'sub_key{i+1}' for i in range(len(sub_keys))]
+            csvwriter.writerow(headers)
+            csvwriter.writerow([master_key] + sub_keys)
+
+
+# Column names of the attendance_log table, by log.csv column
+SQLITE_LOG_COLUMNS = {
+    'ID': 'id',
+    'Employee ID': 'employee_id',
+    'Name': 'name',
+    'Group': 'group_name',
+    'Action': 'action',
+    'Date': 'date',
+    'Start Time': 'start_time',
+    'End Time': 'end_time',
+    'Time Consumed': 'time_consumed',
+    'Shift': 'shift',
+    'Lateness Duration': 'lateness_duration',
+    'Status': 'status',
+    'Consumed Seconds': 'consumed_seconds',
+    'Lateness Seconds': 'lateness_seconds',
+}
+
+SQLITE_SECONDS_FIELDS = set(DURATION_SECONDS_COLUMNS.values())
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance_log (
+    id INTEGER PRIMARY KEY,
+    employee_id INTEGER,
+    name TEXT NOT NULL DEFAULT '',
+    group_name TEXT NOT NULL DEFAULT '',
+    action TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL DEFAULT '',
+    start_time TEXT NOT NULL DEFAULT '',
+    end_time TEXT NOT NULL DEFAULT '',
+    time_consumed TEXT NOT NULL DEFAULT '',
+    shift TEXT NOT NULL DEFAULT '',
+    lateness_duration TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT '',
+    consumed_seconds INTEGER,
+    lateness_seconds INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_log_employee_date_action
+    ON attendance_log (employee_id, date, action);
+CREATE INDEX IF NOT EXISTS idx_attendance_log_date
+    ON attendance_log (date);
+CREATE TABLE IF NOT EXISTS employees (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS credentials (
+    position INTEGER PRIMARY KEY,
+    key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SqliteStorage(StorageBackend):
+    """
+    Stores data in a SQLite database in WAL mode, so report pages can read
+    while punches are being written. On first use the existing CSV files are
+    migrated into the database once.
+    """
+
+    def __init__(self, database, csv_source):
+        self.database = database
+        self.csv_source = csv_source
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.database, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SQLITE_SCHEMA)
+                    self._add_missing_columns(conn)
+                    self._migrate_from_csv(conn)
+                    self._initialized = True
+        return conn
+
+    def _get_meta(self, conn, key):
+        row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _add_missing_columns(self, conn):
+        """Adds the integer-second columns to a database created before they existed."""
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(attendance_log)')}
+        for column in ('consumed_seconds', 'lateness_seconds'):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE attendance_log ADD COLUMN {column} INTEGER')
+
+    def _migrate_from_csv(self, conn):
+        """Copies the CSV log, employees.csv and m_credential.csv into an empty database, once."""
+        if self._get_meta(conn, 'csv_migrated'):
+            return
+        # An unsplit log.csv is read in place, so the CSV backend's partition migration never runs here
+        if self.csv_source.is_partitioned():
+            records, last_log_id = self.csv_source.iter_log_records(), self.csv_source.last_log_id
+        else:
+            records, last_log_id = self.csv_source.iter_legacy_log_records(), self.csv_source.legacy_last_log_id
+        with conn:
+            migrated = 0
+            for record in records:
+                if self._insert_log(conn, record, replace=True):
+                    migrated += 1
+            conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                         ('last_log_id', str(last_log_id())))
+            if not conn.execute('SELECT 1 FROM employees LIMIT 1').fetchone():
+                self._insert_employees(conn, self.csv_source.read_employees())
+            if not conn.execute('SELECT 1 FROM credentials LIMIT 1').fetchone():
+                master_key, sub_keys = self.csv_source.read_keys()
+                if master_key:
+                    self._insert_keys(conn, master_key, sub_keys)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_migrated', ?)",
+                         (datetime.now().isoformat(),))
+        app.logger.info(f"Migrated {migrated} log records from CSV into {self.database}.")
+
+    def _insert_log(self, conn, record, replace=False):
+        values = []
+        for field in LOG_FIELDNAMES:
+            value = _clean_log_value(record.get(field))
+            if field in ('ID', 'Employee ID') or field in SQLITE_SECONDS_FIELDS:
+                try:
+                    value = int(float(value))
+                except ValueError:
+                    if field == 'ID':
+                        return False
+                    value = None
+            values.append(value)
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT'
+        conn.execute(
+            f"{verb} INTO attendance_log ({', '.join(SQLITE_LOG_COLUMNS.values())}) "
+            f"VALUES ({', '.join('?' * len(values))})",
+            values
+        )
+        return True
+
+    def _insert_employees(self, conn, employee_list):
+        conn.executemany('INSERT INTO employees (id, name) VALUES (?, ?)',
+                         [(emp['ID'], emp['Name']) for emp in employee_list])
+
+    def _insert_keys(self, conn, master_key, sub_keys):
+        conn.executemany('INSERT INTO credentials (position, key) VALUES (?, ?)',
+                         list(enumerate([master_key] + list(sub_keys))))
+
+    def has_log(self):
+        return self._connect().execute('SELECT 1 FROM attendance_log LIMIT 1').fetchone() is not None
+
+    def last_log_id(self):
+        conn = self._connect()
+        max_id = conn.execute('SELECT MAX(id) FROM attendance_log').fetchone()[0] or 0
+        return max(max_id, int(self._get_meta(conn, 'last_log_id') or 0))
+
+    def save_last_log_id(self, last_id):
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('last_log_id', str(last_id)))
+
+    def _update_log(self, conn, log_id, changes):
+        updates = {SQLITE_LOG_COLUMNS[field]: int(float(value)) if field in SQLITE_SECONDS_FIELDS else value
+                   for field, value in ((field, _clean_log_value(value)) for field, value in changes.items())
+                   if field in AMENDMENT_FIELDNAMES[1:] and value != ''}
+        if updates:
+            conn.execute(
+                f"UPDATE attendance_log SET {', '.join(f'{column} = ?' for column in updates)} WHERE id = ?",
+                list(updates.values()) + [int(log_id)]
+            )
+
+    def append_log(self, data):
+        self.write_batch([('append', data)])
+
+    def amend_log(self, log_id, changes, date_str):
+        self.write_batch([('amend', log_id, changes, date_str)])
+
+    def log_record_date(self, log_id):
+        row = self._connect().execute('SELECT date FROM attendance_log WHERE id = ?', (int(log_id),)).fetchone()
+        return row[0] if row else None
+
+    def write_batch(self, operations):
+        # One transaction, and so one WAL commit, per batch
+        conn = self._connect()
+        with conn:
+            for operation in operations:
+                if operation[0] == 'append':
+                    self._insert_log(conn, operation[1])
+                else:
+                    self._update_log(conn, operation[1], operation[2])
+
+    def _date_range_clause(self, start_date, end_date, employee_id=None, group=None, actions=None):
+        conditions, params = [], []
+        if start_date:
+            conditions.append('date >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append('date <= ?')
+            params.append(end_date)
+        if employee_id is not None:
+            conditions.append('employee_id = ?')
+            params.append(int(employee_id))
+        if group is not None:
+            conditions.append('UPPER(group_name) = ?')
+            params.append(group.strip().upper())
+        if actions is not None:
+            conditions.append(f"action IN ({', '.join('?' * len(actions))})" if actions else '0')
+            params.extend(sorted(actions))
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def log_view(self, start_date=None, end_date=None):
+        # A WAL read transaction keeps seeing this snapshot while the writer commits
+        conn = self._connect()
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute('BEGIN')
+        conn.execute('SELECT 1 FROM attendance_log LIMIT 1').fetchall()
+        return conn
+
+    def read_log_frame(self, start_date=None, end_date=None, columns=None, view=None):
+        where, params = self._date_range_clause(start_date, end_date)
+        stored = log_projection(columns)
+        try:
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(SQLITE_LOG_COLUMNS[field] for field in stored)} FROM attendance_log{where} ORDER BY id",
+                view or self._connect(),
+                params=params
+            )
+        finally:
+            if view is not None:
+                view.rollback()
+        df.columns = stored
+        return fill_duration_seconds(df)[list(columns or LOG_FIELDNAMES)]
+
+    def iter_log_records(self, start_date=None, end_date=None, newest_first=False,
+                         employee_id=None, group=None, actions=None):
+        where, params = self._date_range_clause(start_date, end_date, employee_id, group, actions)
+        cursor = self._connect().execute(
+            f"SELECT {', '.join(SQLITE_LOG_COLUMNS.values())} FROM attendance_log{where} "
+            f"ORDER BY id{' DESC' if newest_first else ''}",
+            params
+        )
+        for row in cursor:
+            yield fill_record_seconds(dict(zip(LOG_FIELDNAMES, row)))
+
+    def backfill_duration_seconds(self, limit):
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT id, time_consumed, lateness_duration FROM attendance_log "
+            "WHERE (consumed_seconds IS NULL AND time_consumed != '') "
+            "OR (lateness_seconds IS NULL AND lateness_duration != '') ORDER BY id LIMIT ?",
+            (limit,)
+        ).fetchall()
+        if not rows:
+            return 0
+        df = fill_duration_seconds(pd.DataFrame(rows, columns=['ID', 'Time Consumed', 'Lateness Duration']).replace('', np.nan))
+        values = [(None if pd.isna(consumed) else int(consumed), None if pd.isna(lateness) else int(lateness), int(log_id))
+                  for log_id, consumed, lateness in zip(df['ID'], df['Consumed Seconds'], df['Lateness Seconds'])]
+        with conn:
+            # Values written by a close-out in the meantime are kept
+            conn.executemany('UPDATE attendance_log SET consumed_seconds = COALESCE(consumed_seconds, ?), '
+                             'lateness_seconds = COALESCE(lateness_seconds, ?) WHERE id = ?', values)
+        return len(rows)
+
+    def compact(self):
+        # Move committed WAL pages back into the main database file
+        self._connect().execute('PRAGMA wal_checkpoint(PASSIVE)')
+        return 0
+
+    def purge_duplicate_actions(self, start_date=None, end_date=None):
+        conn = self._connect()
+
+        # Backup the database before making changes
+        backup_file = self.database + ".backup"
+        backup_conn = sqlite3.connect(backup_file)
+        try:
+            conn.backup(backup_conn)
+        finally:
+            backup_conn.close()
+        app.logger.info(f"Backup of database created at {backup_file}.")
+
+        # Keep only the lowest ID for each (Name, Date, Action)
+        where, params = self._date_range_clause(start_date, end_date)
+        range_filter = where.replace(' WHERE ', ' AND ', 1)
+        with conn:
+            cursor = conn.execute(
+                f'DELETE FROM attendance_log WHERE id NOT IN '
+                f'(SELECT MIN(id) FROM attendance_log{where} GROUP BY name, date, action){range_filter}',
+                params + params
+            )
+        return cursor.rowcount
+
+    def read_employees(self):
+        rows = self._connect().execute('SELECT id, name FROM employees ORDER BY rowid').fetchall()
+        return [{'ID': employee_id, 'Name': name} for employee_id, name in rows]
+
+    def employees_version(self):
+        return int(self._get_meta(self._connect(), 'employees_version') or 0)
+
+    def _bump_version(self, conn, key):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+            (key,)
+        )
+
+    def append_employee(self, employee):
+        conn = self._connect()
+        with conn:
+            self._insert_employees(conn, [employee])
+            self._bump_version(conn, 'employees_version')
+
+    def write_employees(self, employee_list):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM employees')
+            self._insert_employees(conn, employee_list)
+            self._bump_version(conn, 'employees_version')
+
+    def read_keys(self):
+        rows = self._connect().execute('SELECT key FROM credentials ORDER BY position').fetchall()
+        if not rows:
+            return None, []
+        return rows[0][0], [row[0] for row in rows[1:]]
+
+    def keys_version(self):
+        return int(self._get_meta(self._connect(), 'keys_version') or 0)
+
+    def write_keys(self, master_key, sub_keys):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM credentials')
+            self._insert_keys(conn, master_key, sub_keys)
+            self._bump_version(conn, 'keys_version')
+
+
+def create_storage(backend):
+    """Builds the storage backend named by the STORAGE_BACKEND setting."""
+    csv_storage = CsvStorage(LOG_PARTITION_DIR, LOG_ARCHIVE_DIR, LOG_FILE, AMENDMENTS_FILE, EMPLOYEES_FILE, m_credential_FILE)
+    if backend == 'csv':
+        return csv_storage
+    if backend == 'sqlite':
+        return SqliteStorage(app.config['SQLITE_DATABASE'], csv_storage)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage = create_storage(app.config['STORAGE_BACKEND'])
+
+
+# Employee roster cache.
+# The roster is parsed once and kept keyed by ID. Every lookup compares the
+# storage version token (file mtime for CSV, a meta counter for SQLite) so
+# edits made outside the app are picked up; writes from the employee admin
+# routes go through the cache and update it in place.
+class RosterCache:
+    """In-memory employee roster with O(1) ID lookup, invalidated by the storage version."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.version = 0                  # bumped on every reload or in-place write
+        self._lock = threading.RLock()
+        self._records = None              # ID -> {'ID', 'Name'}, in roster order
+        self._by_name = {}                # lowercased name -> list of IDs
+        self._source_version = None
+
+    def _load(self):
+        try:
+            employee_list = self.backend.read_employees()
         except Exception as e:
             app.logger.error(f"Error reading employee list: {e}")
-    else:
-        app.logger.warning("Employee list file does not exist.")
-    return employee_list
+            employee_list = []
+        self._records = {}
+        for emp in employee_list:
+            self._records[emp['ID']] = {'ID': emp['ID'], 'Name': emp['Name']}
+        self._rebuild_names()
+        self.version += 1
+
+    def _rebuild_names(self):
+        self._by_name = {}
+        for emp in self._records.values():
+            self._by_name.setdefault(emp['Name'].lower(), []).append(emp['ID'])
+
+    def _fresh(self):
+        """Reloads the roster if storage changed behind the cache; caller holds the lock."""
+        try:
+            source_version = self.backend.employees_version()
+        except Exception as e:
+            app.logger.error(f"Error checking employee list version: {e}")
+            source_version = self._source_version
+        if self._records is None or source_version != self._source_version:
+            self._load()
+            self._source_version = source_version
+        return self._records
+
+    def _written(self):
+        self._rebuild_names()
+        self.version += 1
+        self._source_version = self.backend.employees_version()
+
+    def employees(self):
+        """Returns the roster as a list of dictionaries, in storage order."""
+        with self._lock:
+            return [dict(emp) for emp in self._fresh().values()]
+
+    def get(self, employee_id):
+        """Returns a copy of the employee with this ID, or None."""
+        with self._lock:
+            emp = self._fresh().get(employee_id)
+            return dict(emp) if emp is not None else None
+
+    def find_by_name(self, name):
+        """Returns the IDs of employees with this name (case-insensitive)."""
+        with self._lock:
+            self._fresh()
+            return list(self._by_name.get(name.strip().lower(), []))
+
+    def next_id(self):
+        """Returns the next four-digit employee ID; raises ValueError if existing IDs are not numeric."""
+        with self._lock:
+            records = self._fresh()
+            if not records:
+                return '0001'  # Start IDs at '0001' if no employees exist
+            return f"{max(int(employee_id) for employee_id in records) + 1:04}"
+
+    def add(self, name):
+        """Adds an employee under the next ID and returns that ID."""
+        with self._lock:
+            new_id = self.next_id()
+            employee = {'ID': new_id, 'Name': name}
+            self.backend.append_employee(employee)
+            self._records[new_id] = employee
+            self._written()
+            return new_id
+
+    def rename(self, employee_id, name):
+        with self._lock:
+            records = self._fresh()
+            updated = [dict(emp, Name=name) if emp['ID'] == employee_id else emp for emp in records.values()]
+            self.backend.write_employees(updated)
+            records[employee_id] = {'ID': employee_id, 'Name': name}
+            self._written()
+
+    def remove(self, employee_id):
+        with self._lock:
+            records = self._fresh()
+            remaining = [emp for emp in records.values() if emp['ID'] != employee_id]
+            self.backend.write_employees(remaining)
+            records.pop(employee_id, None)
+            self._written()
+
+
+roster = RosterCache(storage)
+
+
+def get_employee_list():
+    """Returns the employee roster as a list of dictionaries."""
+    return roster.employees()
+
+# Reference data registry.
+# Credentials, groups, break limits and shift times are loaded once into an
+# immutable snapshot. A background thread polls the sources for changes and
+# swaps in a fresh snapshot; request handlers only ever read the current one.
+# A source that fails to parse keeps its previous values, or the built-in
+# defaults on a cold start, so there is always a usable snapshot.
+ReferenceData = namedtuple('ReferenceData', [
+    'version', 'master_key', 'sub_keys', 'groups', 'time_limits',
+    'shift_start', 'shift_end', 'expected_time_in',
+    'pm_shift_start', 'pm_shift_end', 'pm_expected_time_in',
+    'shift_rules',
+])
+
+# Groups offered when groups.csv cannot be read
+DEFAULT_GROUPS = ('ADMIN', 'GROUP LEADER', 'HR', 'MBM', 'MDM', 'MKM', 'MQM', 'OFFICE BOY', 'TEAM LEADER', 'TRAINER')
+
+# Settings of shift_times.csv, with their built-in defaults
+SHIFT_TIME_DEFAULTS = {
+    'shift_start': SHIFT_START,
+    'shift_end': SHIFT_END,
+    'expected_time_in': EXPECTED_TIME_IN,
+    'pm_shift_start': PM_SHIFT_START,
+    'pm_shift_end': PM_SHIFT_END,
+    'pm_expected_time_in': PM_EXPECTED_TIME_IN,
+}
+
+
+def read_groups(path):
+    """Reads group names from groups.csv, in file order."""
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        return tuple(row['GroupName'].strip() for row in csv.DictReader(csvfile) if row['GroupName'].strip())
+
+def read_break_limits(path):
+    """Reads break time limits (minutes) from break_limits.csv, falling back to TIME_LIMITS."""
+    if not os.path.isfile(path):
+        return dict(TIME_LIMITS)
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        return {row['Action'].strip(): int(row['Minutes']) for row in csv.DictReader(csvfile) if row['Action'].strip()}
+
+def write_break_limits(path, limits):
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Action', 'Minutes'])
+        writer.writerows(limits.items())
+
+def read_shift_times(path):
+    """Reads shift time overrides (Setting,Time as HH:MM) from shift_times.csv over the defaults."""
+    shift_times = dict(SHIFT_TIME_DEFAULTS)
+    if os.path.isfile(path):
+        with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                setting = row['Setting'].strip().lower()
+                if setting not in shift_times:
+                    raise ValueError(f"Unknown shift setting: {row['Setting']}")
+                shift_times[setting] = datetime.strptime(row['Time'].strip(), '%H:%M').time()
+    return shift_times
+
+
+# Shift rules.
+# A shift policy is a list of time-of-day windows per group, checked in order:
+# each names the shift, its end may be inclusive or exclusive, and it gives
+# the expected arrival time (None when Time-In is not allowed), optionally on
+# the previous day for punches after midnight. A policy may also override
+# break limits for its group. Policies compile into sorted tables of window
+# start offsets, so scoring a punch is a bisect plus an integer compare.
+# Offsets are in microseconds so inclusive ends match punches exactly.
+_MICROS = 1_000_000
+_DAY_MICROS = 24 * 3600 * _MICROS
+
+# Expected arrival times by group, as (AM shift, PM shift)
+GROUP_EXPECTED_TIMES = {
+    'mqm': ('08:45', '20:45'),
+    'mkm': ('08:45', '20:45'),
+    'trainer': ('08:45', '20:45'),
+    'office boy': ('09:00', '21:00'),
+    'mdm': ('08:15', '20:15'),
+    'mbm': ('08:15', '20:15'),
+    'group leader': ('08:15', '20:15'),
+    'team leader': ('08:15', '20:15'),
+    'admin': ('11:00', '23:00'),
+}
+
+
+def default_shift_policies(shift_times):
+    """Builds the built-in shift policies ('*' applies to unlisted groups) from the shift times."""
+    def standard(am_expected, pm_expected):
+        return {'windows': [
+            {'shift': 'AM Shift', 'start': shift_times['shift_start'], 'end': shift_times['shift_end'],
+             'expected': am_expected},
+            {'shift': 'PM Shift', 'start': shift_times['pm_shift_start'], 'end': shift_times['pm_shift_end'],
+             'expected': pm_expected},
+            {'shift': 'PM Shift (after midnight)', 'start': '00:00', 'end': shift_times['shift_start'],
+             'end_inclusive': False, 'expected': pm_expected, 'previous_day': True},
+        ]}
+
+    policies = {'*': standard(shift_times['expected_time_in'], shift_times['pm_expected_time_in'])}
+    for group, (am_expected, pm_expected) in GROUP_EXPECTED_TIMES.items():
+        policies[group] = standard(am_expected, pm_expected)
+    # HR works day and midday shifts only
+    policies['hr'] = {'windows': [
+        {'shift': 'AM Shift', 'start': '06:00', 'end': '10:00', 'end_inclusive': False, 'expected': '08:00'},
+        {'shift': 'Midday Shift', 'start': '10:00', 'end': '18:00', 'end_inclusive': False, 'expected': '12:00'},
+        {'shift': 'No PM Shift', 'start': shift_times['pm_shift_start'], 'end': shift_times['pm_shift_end'],
+         'expected': None},
+        {'shift': 'No PM Shift', 'start': '00:00', 'end': shift_times['shift_start'], 'end_inclusive': False,
+         'expected': None},
+    ]}
+    return policies
+
+def read_shift_policies(path):
+    """Reads per-group policy overrides from shift_policies.json; groups are matched case-insensitively."""
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as policy_file:
+        return {group.strip().lower(): policy for group, policy in json.load(policy_file).items()}
+
+def _time_offset(value):
+    """Converts a time or an 'HH:MM[:SS]' string to microseconds since midnight."""
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * _MICROS + value.microsecond
+
+def format_lateness(minutes):
+    lateness_hours, lateness_remaining_minutes = divmod(minutes, 60)
+    if lateness_hours > 0:
+        if lateness_remaining_minutes > 0:
+            return f'{lateness_hours} hrs & {lateness_remaining_minutes} mins'
+        return f'{lateness_hours} hrs'
+    return f'{lateness_remaining_minutes} mins'
+
+
+class ShiftRules:
+    """Shift policies compiled into per-group lookup tables."""
+
+    def __init__(self, policies):
+        self._tables = {group: self._compile(policy.get('windows', [])) for group, policy in policies.items()}
+        self._break_limits = {group: dict(policy.get('break_limits', {})) for group, policy in policies.items()}
+        if '*' not in self._tables:
+            raise ValueError("Shift policies need a '*' default policy")
+
+    @staticmethod
+    def _compile(windows):
+        compiled = []
+        for window in windows:
+            start = _time_offset(window['start'])
+            end = _time_offset(window['end']) + (1 if window.get('end_inclusive', True) else 0)
+            expected = window.get('expected')
+            if expected is not None:
+                expected = _time_offset(expected) - (_DAY_MICROS if window.get('previous_day') else 0)
+            compiled.append((start, end, window['shift'], expected))
+        # Split the day at every window edge; the first window covering a segment wins
+        starts, shifts, expected_offsets = [], [], []
+        for point in sorted({0} | {edge for start, end, _, _ in compiled for edge in (start, end) if edge < _DAY_MICROS}):
+            rule = next(((shift, expected) for start, end, shift, expected in compiled if start <= point < end),
+                        ('Unknown', None))
+            starts.append(point)
+            shifts.append(rule[0])
+            expected_offsets.append(rule[1])
+        return starts, shifts, expected_offsets
+
+    def _table(self, group):
+        return self._tables.get(group.strip().lower()) or self._tables['*']
+
+    def classify(self, group, timestamp):
+        """Returns (shift, expected offset in microseconds from the punch's midnight or None, punch offset)."""
+        offset = _time_offset(timestamp.time())
+        starts, shifts, expected_offsets = self._table(group)
+        segment = bisect.bisect_right(starts, offset) - 1
+        return shifts[segment], expected_offsets[segment], offset
+
+    def score_time_in(self, group, timestamp):
+        """Returns (shift, lateness in whole minutes or None, status) for a Time-In punch."""
+        shift, expected, offset = self.classify(group, timestamp)
+        if expected is None:
+            return '', None, 'Invalid Time-In'
+        if offset > expected:
+            return shift, (offset - expected) // (60 * _MICROS), 'Late'
+        return shift, None, 'On Time'
+
+    def rescore(self, groups, start_times):
+        """Scores many Time-In punches at once from their Group and 'HH:MM:SS' Start Time columns."""
+        groups = pd.Series(groups, dtype=object).fillna('').astype(str).str.strip().str.lower().reset_index(drop=True)
+        offsets = parse_clock_seconds(start_times).to_numpy() * _MICROS
+        shift = np.full(len(groups), '', dtype=object)
+        lateness = np.full(len(groups), '', dtype=object)
+        status = np.full(len(groups), 'Invalid Time-In', dtype=object)
+        for group, positions in groups.groupby(groups).indices.items():
+            starts, shifts, expected_offsets = self._table(group)
+            punch = offsets[positions]
+            segments = np.searchsorted(np.asarray(starts, dtype=np.int64), punch, side='right') - 1
+            expected = np.array([e if e is not None else np.iinfo(np.int64).min for e in expected_offsets], dtype=np.int64)[segments]
+            scored = (punch >= 0) & (expected != np.iinfo(np.int64).min)
+            late = scored & (punch > expected)
+            shift[positions[scored]] = np.asarray(shifts, dtype=object)[segments[scored]]
+            status[positions[scored]] = np.where(late[scored], 'Late', 'On Time')
+            lateness[positions[late]] = [format_lateness(int(m)) for m in (punch[late] - expected[late]) // (60 * _MICROS)]
+        return pd.DataFrame({'Shift': shift, 'Lateness Duration': lateness, 'Status': status})
+
+    def break_limit(self, group, action, time_limits):
+        """Returns the break limit in minutes for a group, falling back to the global limits."""
+        group_limits = self._break_limits.get(group.strip().lower()) or self._break_limits['*']
+        return group_limits.get(action, time_limits.get(action, 0))
+
+
+class ReferenceRegistry:
+    """Holds the current reference data snapshot and hot-reloads it when a source changes."""
+
+    def __init__(self, backend, groups_file, break_limits_file, shift_times_file, shift_policies_file, poll_interval):
+        self.backend = backend
+        self.groups_file = groups_file
+        self.break_limits_file = break_limits_file
+        self.shift_times_file = shift_times_file
+        self.shift_policies_file = shift_policies_file
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._sources = None
+        self._thread = None
+
+    def _source_versions(self):
+        return (self.backend.keys_version(), _file_version(self.groups_file),
+                _file_version(self.break_limits_file), _file_version(self.shift_times_file),
+                _file_version(self.shift_policies_file))
+
+    def _read_source(self, name, read, fallback):
+        """
+        Reads one source. If it fails, logs the error and returns fallback(previous
+        snapshot), which is None on a cold start; returns (value, loaded).
+        """
+        try:
+            return read(), True
+        except Exception as e:
+            app.logger.error(f"Error loading {name}, keeping the {'previous' if self._snapshot else 'built-in'} values: {e}")
+            return fallback(self._snapshot), False
+
+    def reload(self):
+        """
+        Re-reads every source and swaps in a new snapshot; returns False if a source
+        failed to load. A failed source keeps its previous (or built-in) values.
+        """
+        with self._lock:
+            try:
+                sources = self._source_versions()
+            except Exception as e:
+                app.logger.error(f"Error checking reference data sources: {e}")
+                sources = None
+            (master_key, sub_keys), keys_loaded = self._read_source(
+                'credentials', self.backend.read_keys,
+                lambda previous: (previous.master_key, list(previous.sub_keys)) if previous else (None, []))
+            groups, groups_loaded = self._read_source(
+                'groups', lambda: read_groups(self.groups_file),
+                lambda previous: previous.groups if previous else DEFAULT_GROUPS)
+            time_limits, limits_loaded = self._read_source(
+                'break limits', lambda: read_break_limits(self.break_limits_file),
+                lambda previous: dict(previous.time_limits) if previous else dict(TIME_LIMITS))
+            shift_times, times_loaded = self._read_source(
+                'shift times', lambda: read_shift_times(self.shift_times_file),
+                lambda previous: ({setting: getattr(previous, setting) for setting in SHIFT_TIME_DEFAULTS}
+                                  if previous else dict(SHIFT_TIME_DEFAULTS)))
+
+            def read_shift_rules():
+                policies = default_shift_policies(shift_times)
+                policies.update(read_shift_policies(self.shift_policies_file))
+                return ShiftRules(policies)
+            shift_rules, rules_loaded = self._read_source(
+                'shift policies', read_shift_rules,
+                lambda previous: previous.shift_rules if previous else ShiftRules(default_shift_policies(shift_times)))
+
+            snapshot = ReferenceData(
+                version=(self._snapshot.version + 1) if self._snapshot else 1,
+                master_key=master_key,
+                sub_keys=tuple(sub_keys),
+                groups=groups,
+                time_limits=MappingProxyType(time_limits),
+                shift_rules=shift_rules,
+                **shift_times
+            )
+            self._snapshot = snapshot
+            self._sources = sources
+        app.logger.info(f"Loaded reference data version {snapshot.version}.")
+        return keys_loaded and groups_loaded and limits_loaded and times_loaded and rules_loaded
+
+    def current(self):
+        """Returns the current snapshot without touching the sources."""
+        if self._snapshot is None:
+            self.reload()
+            self._ensure_started()
+        return self._snapshot
+
+    def set_keys(self, master_key, sub_keys):
+        self.backend.write_keys(master_key, sub_keys)
+        self.reload()
+
+    def set_break_limits(self, limits):
+        write_break_limits(self.break_limits_file, limits)
+        self.reload()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='reference-data', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            sleep(self.poll_interval)
+            try:
+                changed = self._source_versions() != self._sources
+            except Exception as e:
+                app.logger.error(f"Error checking reference data sources: {e}")
+                continue
+            if changed:
+                self.reload()
+
+
+reference_registry = ReferenceRegistry(
+    storage,
+    GROUPS_FILE,
+    BREAK_LIMITS_FILE,
+    SHIFT_TIMES_FILE,
+    SHIFT_POLICIES_FILE,
+    poll_interval=REFERENCE_DATA_POLL_INTERVAL
+)
+
+
+def reference_data():
+    """Returns the current reference data snapshot."""
+    return reference_registry.current()
 
 def get_keys():
-    """Read the master key and all sub-keys from the CSV file."""
-    if os.path.isfile(m_credential_FILE):
-        with open(m_credential_FILE, 'r', newline='', encoding='utf-8') as csvfile:
-            csvreader = csv.reader(csvfile)
-            headers = next(csvreader, None)  # Skip header
-            for row in csvreader:
-                if row:
-                    master_key = row[0].strip()
-                    sub_keys = [key.strip() for key in row[1:]]  # Get all the sub-keys
-                    return master_key, sub_keys
-    return None, []
+    """Returns the master key and a copy of the sub-keys from the reference data."""
+    snapshot = reference_data()
+    return snapshot.master_key, list(snapshot.sub_keys)
 
 def set_keys(master_key, sub_keys):
-    """Write the master key and sub-keys to the CSV file."""
-    with open(m_credential_FILE, 'w', newline='', encoding='utf-8') as csvfile:
-        csvwriter = csv.writer(csvfile)
-        headers = ['master_key'] + [f'sub_key{i+1}' for i in range(len(sub_keys))]
-        csvwriter.writerow(headers)
-        csvwriter.writerow([master_key] + sub_keys)
+    """Write the master key and sub-keys to storage."""
+    reference_registry.set_keys(master_key, sub_keys)
+
+# Clock source.
+# Punches read a local clock corrected by an offset against a reference time
+# source (worldtimeapi.org by default). The offset is re-synced in a
+# background thread, so a punch never waits on the network. Repeated sync
+# failures open a circuit breaker that pauses syncing for a cooldown period.
+def worldtimeapi_reference():
+    """Fetches the current time in Pakistan from worldtimeapi.org; returns an aware datetime."""
+    response = requests.get('http://worldtimeapi.org/api/timezone/Asia/Karachi', timeout=5)
+    response.raise_for_status()
+    return datetime.fromisoformat(response.json()['datetime'])
+
+
+class ClockService:
+    """Drift-corrected clock synced in the background against a pluggable reference."""
+
+    def __init__(self, reference, sync_interval, failure_threshold, breaker_cooldown):
+        self.reference = reference
+        self.sync_interval = sync_interval
+        self.failure_threshold = failure_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._lock = threading.Lock()
+        self._anchor_wall = datetime.now().timestamp()
+        self._anchor_monotonic = monotonic()
+        self._offset = 0.0                # seconds to add to the local clock
+        self._synced_at = None            # monotonic time of the last successful sync
+        self._failures = 0
+        self._breaker_open_until = 0.0
+        self._thread = None
+
+    def _local_timestamp(self):
+        # Wall time derived from the monotonic clock, so local clock jumps do not leak into punches
+        return self._anchor_wall + (monotonic() - self._anchor_monotonic)
+
+    def now(self):
+        """Returns the corrected current time in LOCAL_TIME_ZONE without blocking."""
+        self._ensure_started()
+        return datetime.fromtimestamp(self._local_timestamp() + self._offset, LOCAL_TIME_ZONE)
+
+    def sync(self):
+        """Measures the offset against the reference once; returns True on success."""
+        with self._lock:
+            if monotonic() < self._breaker_open_until:
+                return False
+        try:
+            sent = self._local_timestamp()
+            reference_time = self.reference()
+            received = self._local_timestamp()
+            # Assume the reference was read half way through the round trip
+            offset = reference_time.timestamp() - (sent + received) / 2
+        except Exception as e:
+            with self._lock:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._breaker_open_until = monotonic() + self.breaker_cooldown
+                    app.logger.warning(f"Clock sync failed {self._failures} times; pausing for {self.breaker_cooldown}s.")
+            app.logger.error(f"Exception occurred while syncing time: {e}")
+            return False
+        with self._lock:
+            self._offset = offset
+            self._synced_at = monotonic()
+            self._failures = 0
+            self._breaker_open_until = 0.0
+        return True
+
+    def staleness(self):
+        """Returns the seconds since the last successful sync, or None if it never synced."""
+        return None if self._synced_at is None else monotonic() - self._synced_at
+
+    def status(self):
+        with self._lock:
+            breaker_open = monotonic() < self._breaker_open_until
+            return {
+                'offset_seconds': round(self._offset, 3),
+                'staleness_seconds': None if self._synced_at is None else round(monotonic() - self._synced_at, 1),
+                'consecutive_failures': self._failures,
+                'circuit_breaker': 'open' if breaker_open else 'closed',
+            }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='clock-sync', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self.sync()
+            sleep(self.sync_interval)
+
+
+clock = ClockService(
+    worldtimeapi_reference,
+    sync_interval=CLOCK_SYNC_INTERVAL,
+    failure_threshold=CLOCK_FAILURE_THRESHOLD,
+    breaker_cooldown=CLOCK_BREAKER_COOLDOWN
+)
+
 
 def get_pakistan_time():
-    """Fetch the current time in Pakistan timezone from an external API."""
-    try:
-        response = requests.get('http://worldtimeapi.org/api/timezone/Asia/Karachi', timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            datetime_str = data['datetime']  # ISO 8601 format
-            timestamp = datetime.fromisoformat(datetime_str[:-1])  # Remove the 'Z' at the end
-            return LOCAL_TIME_ZONE.localize(timestamp)
-        else:
-            app.logger.warning("Error fetching time from API, using local time.")
-            return datetime.now(LOCAL_TIME_ZONE)
-    except Exception as e:
-        app.logger.error(f"Exception occurred while fetching time: {e}")
-        return datetime.now(LOCAL_TIME_ZONE)
+    """Returns the current time in Pakistan timezone from the drift-corrected clock."""
+    return clock.now()
 
 def login_required(f):
     """Decorator to ensure the user is authenticated."""
@@ -181,7 +2012,11 @@ def handle_halfday_time_in(employee_id, name, group, timestamp, date_str, time_s
     Handles the Halfday Time-In action by recording it without enforcing schedule.
     """
     # Initialize log ID
-    new_id = get_next_log_id()
+    try:
+        new_id = get_next_log_id()
+    except Exception:
+        flash('Failed to record action. Please try again.', 'danger')
+        return redirect(url_for('index'))
 
     # Log the data
     data = {
@@ -196,10 +2031,12 @@ def handle_halfday_time_in(employee_id, name, group, timestamp, date_str, time_s
         'Time Consumed': '',
         'Shift': 'Halfday',
         'Lateness Duration': '',
-        'Status': 'Halfday Time-In'
+        'Status': 'Halfday Time-In',
+        'Consumed Seconds': '',
+        'Lateness Seconds': '',
     }
 
-    # Append to log.csv
+    # Append to the attendance log
     append_to_log_file(data)
 
     flash(f"Halfday Time-In recorded for {name} on {date_str} at {time_str}.", 'info')
@@ -209,116 +2046,979 @@ def handle_halfday_time_out(employee_id, name, group, timestamp, date_str, time_
     """
     Handles the Halfday Time-Out action by updating the corresponding Halfday Time-In entry.
     """
-    if os.path.isfile(LOG_FILE):
-        try:
-            df = pd.read_csv(LOG_FILE, encoding='utf-8')
-            # Fill NaN values
-            df['Action'] = df['Action'].fillna('')
-            df['End Time'] = df['End Time'].fillna('')
-            df['Date'] = df['Date'].fillna('')
-            df['Start Time'] = df['Start Time'].fillna('')
-            # Find the last Halfday Time-In entry for this user and date without End Time
-            mask = (
-                (df['Employee ID'] == int(employee_id)) &
-                (df['Date'].str.strip() == date_str) &
-                (df['Action'].str.lower() == 'halfday_time_in') &
-                (df['End Time'].str.strip() == '')
-            )
-            if not mask.any():
-                flash('Cannot Halfday Time-Out without Halfday Time-In first.', 'warning')
-                return redirect(url_for('index'))
-            else:
-                # Get index of the entry
-                idx = df[mask].index[-1]
-                # Update the entry
-                end_time_str = time_str
-                start_time_str = df.loc[idx, 'Start Time']
-                if not start_time_str:
-                    flash('Start Time is missing for Halfday Time-In. Cannot record Halfday Time-Out.', 'danger')
-                    return redirect(url_for('index'))
-                # Parse times
-                start_time = datetime.strptime(start_time_str, '%H:%M:%S')
-                end_time = datetime.strptime(end_time_str, '%H:%M:%S')
-                # If end_time < start_time, it means the end time is on the next day
-                if end_time < start_time:
-                    end_time += timedelta(days=1)
-                duration_td = end_time - start_time
-                duration_seconds = duration_td.total_seconds()
-
-                # Extract hours, minutes, and seconds
-                duration_hours = int(duration_seconds // 3600)
-                duration_remaining_seconds = int(duration_seconds % 3600)
-                duration_minutes = duration_remaining_seconds // 60
-                duration_secs = duration_remaining_seconds % 60
-
-                # Format Time Consumed
-                duration_str_parts = []
-                if duration_hours > 0:
-                    duration_str_parts.append(f"{duration_hours} hrs")
-                if duration_minutes > 0:
-                    duration_str_parts.append(f"{duration_minutes} mins")
-                if duration_secs > 0:
-                    duration_str_parts.append(f"{duration_secs} secs")
-                duration_str = ' & '.join(duration_str_parts) if duration_str_parts else '0 secs'
-
-                # Update the Action to combine Halfday_Time_In and Halfday_Time_Out
-                df.loc[idx, 'Action'] = 'Halfday_Time_In/Halfday_Time_Out'
-                df.loc[idx, 'End Time'] = end_time_str
-                df.loc[idx, 'Time Consumed'] = duration_str
-                df.loc[idx, 'Status'] = 'Halfday Time-Out'
-
-                # Save the DataFrame back to CSV
-                df.to_csv(LOG_FILE, index=False, quoting=csv.QUOTE_ALL)
-                app.logger.info(f"Halfday Time-Out recorded and combined for {name} on {date_str} at {end_time_str}.")
-                flash(f"Halfday Time-Out recorded and combined for {name} on {date_str} at {end_time_str}.", 'info')
+    try:
+        # Find the last Halfday Time-In entry for this user and date without End Time
+        log_id = get_open_record_id(employee_id, date_str, 'halfday_time_in')
+        if log_id is None:
+            flash('Cannot Halfday Time-Out without Halfday Time-In first.', 'warning')
+            return redirect(url_for('index'))
+        else:
+            # Update the entry
+            end_time_str = time_str
+            start_time_str = get_indexed_record(log_id)['Start Time']
+            if not start_time_str:
+                flash('Start Time is missing for Halfday Time-In. Cannot record Halfday Time-Out.', 'danger')
                 return redirect(url_for('index'))
-        except Exception as e:
-            app.logger.error(f"Error processing Halfday Time-Out: {e}")
-            flash('Failed to record Halfday Time-Out. Please try again.', 'danger')
+            # Parse times
+            start_time = datetime.strptime(start_time_str, '%H:%M:%S')
+            end_time = datetime.strptime(end_time_str, '%H:%M:%S')
+            # If end_time < start_time, it means the end time is on the next day
+            if end_time < start_time:
+                end_time += timedelta(days=1)
+            duration_seconds = int((end_time - start_time).total_seconds())
+
+            # Update the Action to combine Halfday_Time_In and Halfday_Time_Out
+            amend_log_record(log_id, {
+                'Action': 'Halfday_Time_In/Halfday_Time_Out',
+                'End Time': end_time_str,
+                'Time Consumed': format_duration(duration_seconds),
+                'Status': 'Halfday Time-Out',
+                'Consumed Seconds': duration_seconds,
+            })
+            app.logger.info(f"Halfday Time-Out recorded and combined for {name} on {date_str} at {end_time_str}.")
+            flash(f"Halfday Time-Out recorded and combined for {name} on {date_str} at {end_time_str}.", 'info')
             return redirect(url_for('index'))
-    else:
-        flash('Cannot Halfday Time-Out without Halfday Time-In first.', 'warning')
+    except Exception as e:
+        app.logger.error(f"Error processing Halfday Time-Out: {e}")
+        flash('Failed to record Halfday Time-Out. Please try again.', 'danger')
         return redirect(url_for('index'))
 
+# Log ID allocation.
+# The last issued ID is kept in memory and seeded once from storage (the
+# highest ID in the newest partitions, or MAX(id) in SQLite). Rewrites that can drop the newest rows
+# (purge) persist the high-water mark so IDs are never handed out twice.
+# Every issued ID that reaches storage is covered by the seed after a crash,
+# but the counter is only safe with one writer process, which the instance
+# lock below enforces.
+_log_id_lock = threading.Lock()
+_last_log_id = None
+_instance_lock = None
+
+
+def acquire_instance_lock():
+    """Locks INSTANCE_LOCK_FILE for the life of the process; raises RuntimeError if another process holds it."""
+    global _instance_lock
+    if _instance_lock is not None:
+        return
+    handle = open(INSTANCE_LOCK_FILE, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        raise RuntimeError(f"Another process is already using the data in {BASE_DIR}; "
+                           f"the app must run as a single process.")
+    _instance_lock = handle
+
+
+def persist_log_id_high_water_mark():
+    """Stores the last issued log ID so it survives rewrites that drop the newest rows."""
+    with _log_id_lock:
+        last_id = _last_log_id if _last_log_id is not None else storage.last_log_id()
+        storage.save_last_log_id(last_id)
+
+
 def get_next_log_id():
-    """Retrieves the next available log ID."""
-    if os.path.isfile(LOG_FILE):
-        try:
-            with open(LOG_FILE, 'r', newline='', encoding='utf-8') as csvfile:
-                csvreader = csv.reader(csvfile)
-                next(csvreader, None)  # Skip header
-                last_id = 0
-                for row in csvreader:
-                    if row and row[0].isdigit():
-                        last_id = int(row[0])
-                return last_id + 1
-        except Exception as e:
-            app.logger.error(f"Error reading log file for next ID: {e}")
-            return 1
-    else:
-        return 1
+    """Allocates and returns the next available log ID."""
+    global _last_log_id
+    with _log_id_lock:
+        if _last_log_id is None:
+            try:
+                _last_log_id = storage.last_log_id()
+            except Exception as e:
+                app.logger.error(f"Error reading log file for next ID: {e}")
+                raise
+        _last_log_id += 1
+        return _last_log_id
+
+# Group-commit log writer.
+# Appends and amendments from request threads are queued to a single writer
+# thread, which gathers everything queued within LOG_WRITE_INTERVAL into one
+# storage write. Requests wait on a Future until their operation is written,
+# so writes are ordered and a punch is never acknowledged before it is stored.
+class LogWriter:
+    """Single background thread that applies queued log operations in batches."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, operation):
+        """Queues a storage operation and returns a Future resolved once it is written."""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                    self._thread.start()
+                    start_duration_migration()
+        future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = monotonic() + self.interval
+            while True:
+                remaining = deadline - monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        with _log_write_lock:
+            # Operations their caller gave up on (cancelled after LOG_WRITE_TIMEOUT) are never written
+            batch = [(operation, future) for operation, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                return
+            operations = [operation for operation, _ in batch]
+            try:
+                storage.write_batch(operations)
+                errors = [None] * len(batch)
+            except Exception as e:
+                # Retry one by one so a single bad record does not fail the whole batch
+                app.logger.error(f"Error writing batch of {len(batch)} log operations: {e}")
+                errors = []
+                for operation in operations:
+                    try:
+                        storage.write_batch([operation])
+                        errors.append(None)
+                    except Exception as operation_error:
+                        errors.append(operation_error)
+            for (operation, future), error in zip(batch, errors):
+                if error is not None:
+                    future.set_exception(error)
+                    continue
+                if operation[0] == 'append':
+                    index_log_record(operation[1])
+                    summarize_log_record(operation[1])
+                    live_dashboard.record_appended(operation[1])
+                else:
+                    index_log_amendment(operation[1], operation[2])
+                    summarize_log_amendment(operation[1], operation[2])
+                    live_dashboard.record_amended(operation[1], operation[2])
+                future.set_result(None)
+            if any(error is None for error in errors):
+                bump_log_generation()
+
+
+log_writer = LogWriter(LOG_WRITE_INTERVAL)
+
+
+def wait_for_log_write(future):
+    """
+    Waits until a queued log operation is written; raises on failure. An operation
+    still queued after LOG_WRITE_TIMEOUT is cancelled, so a write reported as
+    failed is never applied later; one already being written is waited for.
+    """
+    try:
+        future.result(timeout=LOG_WRITE_TIMEOUT)
+    except TimeoutError:
+        if future.cancel():
+            raise
+        future.result()
+
+def write_log_record(data):
+    """Appends a single record to the attendance log, waiting until it is written; raises on failure."""
+    wait_for_log_write(log_writer.submit(('append', data)))
 
 def append_to_log_file(data):
-    """Appends a single record to the log.csv file."""
-    file_exists = os.path.isfile(LOG_FILE)
+    """Appends a single record to the attendance log."""
     try:
-        with open(LOG_FILE, 'a', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['ID', 'Employee ID', 'Name', 'Group', 'Action', 'Date',
-                          'Start Time', 'End Time', 'Time Consumed', 'Shift',
-                          'Lateness Duration', 'Status']
-            csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-            if not file_exists:
-                csvwriter.writeheader()
-            csvwriter.writerow(data)
+        write_log_record(data)
     except Exception as e:
         app.logger.error(f"Error writing to log file: {e}")
         flash('Failed to record action. Please try again.', 'danger')
 
 
+# Append-only amendments.
+# Closing an open record (Time-Out, Halfday Time-Out, Back to Work) records
+# the new values against the original ID. The CSV backend appends them to
+# log_amendments.csv instead of rewriting log.csv; readers fold them in and a
+# background compactor periodically merges them into the base file.
+def amend_log_record(log_id, changes):
+    """
+    Records new values for the amendable fields of an existing log row.
+    Empty values in an amendment mean "unchanged". Raises LookupError if the
+    row is not in the live (unarchived) log.
+    """
+    record = get_indexed_record(log_id)
+    if record is not None:
+        date_str = record['Date']
+    else:
+        # Older than the attendance index: the amendment must be filed under the row's own date
+        date_str = storage.log_record_date(log_id)
+        if date_str is None:
+            raise LookupError(f"Log ID {log_id} is not in the live log and cannot be amended.")
+    operation = ('amend', log_id, changes, date_str)
+    wait_for_log_write(log_writer.submit(operation))
+
+
+def fold_amendments(df, amendments):
+    """Applies amendments to a log DataFrame; the latest non-empty value per field wins."""
+    if amendments is None or amendments.empty or df.empty:
+        return df
+    latest = amendments.replace('', pd.NA).groupby('ID').last()
+    df = df.set_index('ID', drop=False)
+    for field in AMENDMENT_FIELDNAMES[1:]:
+        if field not in latest or field not in df:
+            continue
+        values = latest[field].dropna()
+        values = values[values.index.isin(df.index)]
+        if not values.empty:
+            df[field] = df[field].astype(object)
+            df.loc[values.index, field] = values
+    return df.reset_index(drop=True)
+
+
+# Typed log frames.
+# Every in-process read of the log as a DataFrame goes through read_log_frame().
+# Text columns come back with '' for empty cells; the low-cardinality ones
+# (LOG_CATEGORY_COLUMNS) as categoricals and IDs and seconds as small nullable
+# integers. Callers name the columns they use, so storage parses only those.
+# Parsed frames are kept per log generation under a memory budget.
+class LogFrameCache:
+    """LRU cache of typed log frames for the current log generation, capped by their memory use."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._generation = None
+        self._entries = OrderedDict()     # (start date, end date, columns) -> (frame, bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, generation, key):
+        with self._lock:
+            if generation != self._generation:
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, generation, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if self._generation is not None and generation < self._generation:
+                # A read that finished after a newer one was cached
+                return
+            if generation != self._generation:
+                # Any write makes every cached frame stale
+                self._entries.clear()
+                self._size = 0
+                self._generation = generation
+            if size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (df, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+
+log_frame_cache = LogFrameCache(LOG_FRAME_CACHE_MAX_BYTES)
+
+
+def apply_log_dtypes(df):
+    """Converts a log DataFrame as read from storage to the typed layout, in place."""
+    for column in df.columns:
+        if column in LOG_INTEGER_DTYPES:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(LOG_INTEGER_DTYPES[column])
+            continue
+        text = df[column].astype(object)
+        text = text.where(text.notna(), '')
+        df[column] = text.astype('category') if column in LOG_CATEGORY_COLUMNS else text
+    return df
+
+
+def read_log_frame(start_date=None, end_date=None, columns=None):
+    """
+    Reads the attendance log into a typed DataFrame with all pending amendments applied.
+    Optional inclusive 'YYYY-MM-DD' bounds limit the read to the matching partitions, and
+    `columns` to the listed columns. The frame may be shared from the cache, so callers
+    must not modify its values in place.
+    """
+    return read_log_frame_at(start_date, end_date, columns)[0]
+
+
+def read_log_frame_at(start_date=None, end_date=None, columns=None):
+    """
+    Like read_log_frame(), and also returns the log generation the frame reflects.
+    The write lock is only held to pin a view of the log; parsing runs without it.
+    If rewrites keep invalidating the view, the last attempt reads under the lock.
+    """
+    columns = tuple(columns or LOG_FIELDNAMES)
+    key = (start_date, end_date, columns)
+    for attempt in range(LOG_READ_ATTEMPTS):
+        view = None
+        with _log_write_lock:
+            generation = _log_generation
+            df = log_frame_cache.get(generation, key)
+            if df is None:
+                # A cached full read of the same range covers any projection of it
+                full = log_frame_cache.get(generation, (start_date, end_date, tuple(LOG_FIELDNAMES)))
+                if full is not None:
+                    df = full[list(columns)]
+                elif attempt < LOG_READ_ATTEMPTS - 1:
+                    view = storage.log_view(start_date, end_date)
+                if df is None and view is None:
+                    df = apply_log_dtypes(storage.read_log_frame(start_date, end_date, list(columns)))
+                if df is not None:
+                    log_frame_cache.put(generation, key, df)
+        if df is None:
+            try:
+                df = apply_log_dtypes(storage.read_log_frame(start_date, end_date, list(columns), view=view))
+            except StaleLogView:
+                continue
+            log_frame_cache.put(generation, key, df)
+        return df.copy(deep=False), generation
+
+
+def bump_log_generation():
+    """Marks the log as changed so caches derived from it are rebuilt; caller holds _log_write_lock."""
+    global _log_generation
+    _log_generation += 1
+
+
+def compact_log():
+    """
+    Merges pending amendments into the base log.
+    Returns the number of amendments merged.
+    """
+    global _pending_amendments
+    with _log_write_lock:
+        merged = storage.compact()
+        _pending_amendments = 0
+    if merged:
+        app.logger.info(f"Compacted {merged} amendments into the log file.")
+    return merged
+
+
+def _notify_compactor(count=1):
+    """Counts new amendments, starting the compactor thread on first use."""
+    global _pending_amendments, _compactor_thread
+    with _compactor_lock:
+        _pending_amendments += count
+        if _compactor_thread is None:
+            _compactor_thread = threading.Thread(target=_compactor_loop, name='log-compactor', daemon=True)
+            _compactor_thread.start()
+        if _pending_amendments >= LOG_COMPACTION_THRESHOLD:
+            _compactor_wakeup.set()
+
+
+def _compactor_loop():
+    while True:
+        _compactor_wakeup.wait(LOG_COMPACTION_INTERVAL)
+        _compactor_wakeup.clear()
+        try:
+            compact_log()
+        except Exception as e:
+            app.logger.error(f"Error compacting log file: {e}")
+
+
+_log_write_lock = threading.RLock()
+_log_generation = 0  # bumped under _log_write_lock whenever log contents change
+LOG_READ_ATTEMPTS = 3  # pinned reads tried before reading under the write lock
+_compactor_lock = threading.Lock()
+_compactor_wakeup = threading.Event()
+_compactor_thread = None
+_pending_amendments = 0
+
+
+# Duration back-fill.
+# Rows written before the integer-second columns existed only carry display
+# durations. Readers derive the missing seconds on the fly; this one-time
+# migration stores them, DURATION_MIGRATION_CHUNK_ROWS at a time, holding the
+# write lock only for one chunk so punches are never held up for long.
+_migration_lock = threading.Lock()
+_migration_thread = None
+
+
+def migrate_duration_seconds(pause=0):
+    """Back-fills the integer-second columns chunk by chunk; returns the number of rows handled."""
+    total = 0
+    while True:
+        with _log_write_lock:
+            handled = storage.backfill_duration_seconds(DURATION_MIGRATION_CHUNK_ROWS)
+        if not handled:
+            break
+        total += handled
+        sleep(pause)
+    if total:
+        app.logger.info(f"Back-filled integer-second durations for {total} log rows.")
+    return total
+
+
+def start_duration_migration():
+    """Starts the back-fill in a background thread, once per process."""
+    global _migration_thread
+    with _migration_lock:
+        if _migration_thread is None:
+            _migration_thread = threading.Thread(target=_migration_loop, name='duration-migration', daemon=True)
+            _migration_thread.start()
+
+
+def _migration_loop():
+    try:
+        migrate_duration_seconds(DURATION_MIGRATION_PAUSE)
+    except Exception as e:
+        app.logger.error(f"Error back-filling duration seconds: {e}")
+
+
+# In-memory attendance index.
+# Built once from storage and kept in sync by every code path that appends to
+# or amends the log, so the validation checks in submit() never touch disk.
+_index_lock = threading.RLock()
+_index_built = False
+_index_records = {}               # log ID -> indexed fields of the record
+_index_actions = Counter()        # (employee ID, date, action) -> number of rows
+_index_open = {}                  # (employee ID, date, action) -> [open log IDs]
+INDEXED_FIELDS = ['Employee ID', 'Date', 'Action', 'Start Time', 'End Time']
+
+
+def _clean_log_value(value):
+    """Returns a stripped string for a log cell, treating NaN/None as empty."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return str(value).strip()
+
+
+def _index_key(record):
+    """Builds the (log ID, employee ID) pair for a log record, or None if it cannot be indexed."""
+    try:
+        log_id = int(float(_clean_log_value(record.get('ID'))))
+        employee_id = int(float(_clean_log_value(record.get('Employee ID'))))
+    except ValueError:
+        return None
+    return log_id, employee_id
+
+
+def _index_add(log_id, employee_id, record):
+    fields = {field: _clean_log_value(record.get(field)) for field in INDEXED_FIELDS}
+    key = (employee_id, fields['Date'], fields['Action'].lower())
+    _index_records[log_id] = fields
+    _index_actions[key] += 1
+    if fields['End Time'] == '':
+        _index_open.setdefault(key, []).append(log_id)
+
+
+def _index_remove(log_id):
+    fields = _index_records.pop(log_id, None)
+    if fields is None:
+        return
+    key = (int(float(fields['Employee ID'])), fields['Date'], fields['Action'].lower())
+    _index_actions[key] -= 1
+    if _index_actions[key] <= 0:
+        del _index_actions[key]
+    if fields['End Time'] == '':
+        open_ids = _index_open.get(key, [])
+        if log_id in open_ids:
+            open_ids.remove(log_id)
+        if not open_ids:
+            _index_open.pop(key, None)
+
+
+def rebuild_attendance_index():
+    """Rebuilds the in-memory attendance index from storage."""
+    global _index_built
+    with _index_lock:
+        _index_records.clear()
+        _index_actions.clear()
+        _index_open.clear()
+        try:
+            # Punch validation only looks at recent days, so older partitions are skipped
+            since = (get_pakistan_time() - timedelta(days=ATTENDANCE_INDEX_DAYS)).strftime('%Y-%m-%d')
+            for row in storage.iter_log_records(start_date=since):
+                indexed = _index_key(row)
+                if indexed:
+                    _index_remove(indexed[0])
+                    _index_add(indexed[0], indexed[1], row)
+        except Exception as e:
+            app.logger.error(f"Error building attendance index: {e}")
+            raise
+        _index_built = True
+        app.logger.info(f"Attendance index built with {len(_index_records)} records.")
+
+
+def _ensure_attendance_index():
+    if not _index_built:
+        with _index_lock:
+            if not _index_built:
+                rebuild_attendance_index()
+
+
+def _index_apply_amendment(log_id, changes):
+    fields = _index_records.get(log_id)
+    if fields is None:
+        return
+    record = dict(fields)
+    record.update({field: value for field, value in changes.items()
+                   if field in INDEXED_FIELDS and _clean_log_value(value) != ''})
+    _index_remove(log_id)
+    _index_add(log_id, int(float(record['Employee ID'])), record)
+
+
+def index_log_record(record):
+    """
+    Inserts or replaces a single log record in the attendance index.
+    Must be called after every append to the attendance log.
+    """
+    indexed = _index_key(record)
+    if not indexed:
+        return
+    with _index_lock:
+        if not _index_built:
+            # The record is already on disk, so a full build picks it up.
+            rebuild_attendance_index()
+            return
+        _index_remove(indexed[0])
+        _index_add(indexed[0], indexed[1], record)
+
+
+def index_log_amendment(log_id, changes):
+    """Applies an amendment to the indexed copy of a log record."""
+    with _index_lock:
+        if not _index_built:
+            rebuild_attendance_index()
+            return
+        _index_apply_amendment(log_id, changes)
+
+
+def has_performed_action(employee_id, date_str, action):
+    """Returns True if a log row with this action exists for the employee on the given date."""
+    _ensure_attendance_index()
+    with _index_lock:
+        return _index_actions.get((int(employee_id), date_str, action.lower()), 0) > 0
+
+
+def get_open_record_id(employee_id, date_str, action):
+    """Returns the ID of the latest row with this action and no End Time, or None."""
+    _ensure_attendance_index()
+    with _index_lock:
+        open_ids = _index_open.get((int(employee_id), date_str, action.lower()))
+        return open_ids[-1] if open_ids else None
+
+
+def get_indexed_record(log_id):
+    """Returns a copy of the indexed fields of a log record, or None if the ID is unknown."""
+    _ensure_attendance_index()
+    with _index_lock:
+        fields = _index_records.get(int(log_id))
+        return dict(fields) if fields is not None else None
+
+
+# Daily summaries.
+# Per (employee, date) totals are built with one vectorized scan of the log
+# on first use and then kept up to date by the log writer. A new row adds its
+# Time-In lateness. An amendment that closes a record (Time-Out, Halfday
+# Time-Out, Back to Work) adds its duration and any overbreak. Every employee
+# also keeps running prefix sums over their days, so a total between two
+# dates is one subtraction.
+LOG_METRIC_COLUMNS = ['Employee ID', 'Action', 'Date', 'Status', 'Consumed Seconds', 'Lateness Seconds']
+SUMMARY_METRICS = ['worked_seconds', 'halfday_seconds', 'late_seconds', 'late_count',
+                   'break_seconds', 'overbreak_seconds', 'overbreak_count']
+
+_summary_lock = threading.RLock()
+_summary_rebuild_lock = threading.RLock()
+_summary_built = False
+_summary_pending = None           # updates committed while a rebuild reads the log
+_summary_days = {}                # (employee ID, date) -> metric values of that day
+_summary_prefix = {}              # employee ID -> (first day ordinal, prefix sums per day)
+
+
+def _seconds_field(record, column):
+    """Returns an integer-second field of a record or amendment, 0 when empty."""
+    value = _clean_log_value(fill_record_seconds(dict(record)).get(column))
+    return int(float(value)) if value else 0
+
+
+def _summary_contribution(action, status, consumed, late):
+    """Returns the metric values a record (or the closing fields of an amendment) adds to its day."""
+    values = [0] * len(SUMMARY_METRICS)
+    action = action.lower()
+    if action in ('time_in', 'time_in/time_out'):
+        values[0] = consumed
+        if status == 'Late':
+            values[2], values[3] = late, 1
+    elif action.startswith('halfday'):
+        values[1] = consumed
+    else:
+        values[4] = consumed
+        if status == 'Overbreak':
+            values[5], values[6] = late, 1
+    return values
+
+
+def _summary_add(employee_id, date_str, values):
+    if not any(values):
+        return
+    try:
+        day = datetime.strptime(date_str, '%Y-%m-%d').toordinal()
+    except ValueError:
+        return
+    totals = _summary_days.setdefault((employee_id, date_str), [0] * len(SUMMARY_METRICS))
+    for k, value in enumerate(values):
+        totals[k] += value
+
+    first_day, prefix = _summary_prefix.get(employee_id, (day, [[0] * len(SUMMARY_METRICS)]))
+    if day < first_day:
+        # No earlier activity, so the new leading days all start from zero
+        prefix = [[0] * len(SUMMARY_METRICS) for _ in range(first_day - day)] + prefix
+        first_day = day
+    position = day - first_day
+    while len(prefix) < position + 2:
+        prefix.append(list(prefix[-1]))
+    # prefix[i] holds the totals of the days before first_day + i; live updates touch the last day or two
+    for row in prefix[position + 1:]:
+        for k, value in enumerate(values):
+            row[k] += value
+    _summary_prefix[employee_id] = (first_day, prefix)
+
+
+def log_metrics(df):
+    """
+    Returns the SUMMARY_METRICS contributed by each row of a log frame, plus the
+    'present' and 'halfday' day flags and the 'Employee ID' and 'Date' keys.
+    """
+    action = df['Action'].astype(str).str.lower()
+    status = df['Status'].astype(str)
+    consumed = df['Consumed Seconds'].fillna(0).astype('int64').clip(lower=0)
+    lateness = df['Lateness Seconds'].fillna(0).astype('int64').clip(lower=0)
+    is_work = action.isin(['time_in', 'time_in/time_out'])
+    is_halfday = ~is_work & action.str.startswith('halfday')
+    is_break = ~is_work & ~is_halfday
+    late = is_work & (status == 'Late')
+    # A break still open when it was flagged Overbreak only counts once it is closed
+    overbreak = is_break & (status == 'Overbreak') & df['Consumed Seconds'].notna()
+    metrics = pd.DataFrame({
+        'worked_seconds': consumed.where(is_work, 0),
+        'halfday_seconds': consumed.where(is_halfday, 0),
+        'late_seconds': lateness.where(late, 0),
+        'late_count': late.astype('int64'),
+        'break_seconds': consumed.where(is_break, 0),
+        'overbreak_seconds': lateness.where(overbreak, 0),
+        'overbreak_count': overbreak.astype('int64'),
+        'present': is_work.astype('int64'),
+        'halfday': is_halfday.astype('int64'),
+    })
+    metrics['Employee ID'] = pd.to_numeric(df['Employee ID'], errors='coerce')
+    metrics['Date'] = df['Date']
+    return metrics
+
+
+def rebuild_daily_summaries():
+    """
+    Rebuilds the daily summaries from a full read of the log. The log is read
+    without blocking writers; updates committed after the generation that was
+    read are queued meanwhile and applied once the new totals are in place.
+    """
+    global _summary_built, _summary_pending
+    with _summary_rebuild_lock:
+        with _summary_lock:
+            _summary_built = False
+            _summary_pending = []
+        try:
+            df, generation = read_log_frame_at(columns=LOG_METRIC_COLUMNS)
+            daily = None
+            if not df.empty:
+                metrics = log_metrics(df)
+                daily = metrics.dropna(subset=['Employee ID']).groupby(['Employee ID', 'Date'], sort=True)[SUMMARY_METRICS].sum()
+        except Exception:
+            with _summary_lock:
+                _summary_pending = None
+            raise
+        with _summary_lock:
+            pending, _summary_pending = _summary_pending, None
+            if pending is None:
+                # Invalidated while reading; the next use rebuilds
+                return
+            _summary_days.clear()
+            _summary_prefix.clear()
+            if daily is not None:
+                for (employee_id, date_str), values in zip(daily.index, daily.to_numpy().tolist()):
+                    _summary_add(int(employee_id), date_str, values)
+            _summary_built = True
+            for committed_at, update, args in pending:
+                if committed_at >= generation:
+                    update(*args)
+        app.logger.info(f"Daily summaries built for {len(_summary_days)} employee days.")
+
+
+def invalidate_daily_summaries():
+    """Drops the daily summaries so they are rebuilt on next use (after rows are removed)."""
+    global _summary_built, _summary_pending
+    with _summary_lock:
+        _summary_built = False
+        _summary_pending = None
+        _summary_days.clear()
+        _summary_prefix.clear()
+
+
+def summarize_log_record(record):
+    """Adds a newly appended record to the daily summaries; caller holds _log_write_lock."""
+    with _summary_lock:
+        if _summary_pending is not None:
+            _summary_pending.append((_log_generation, summarize_log_record, (record,)))
+        indexed = _index_key(record)
+        if not _summary_built or not indexed:
+            return
+        values = _summary_contribution(_clean_log_value(record.get('Action')), _clean_log_value(record.get('Status')),
+                                       _seconds_field(record, 'Consumed Seconds'), _seconds_field(record, 'Lateness Seconds'))
+        _summary_add(indexed[1], _clean_log_value(record.get('Date')), values)
+
+
+def summarize_log_amendment(log_id, changes):
+    """Adds the closing fields of an amendment to the daily summaries; caller holds _log_write_lock."""
+    with _summary_lock:
+        if _summary_pending is not None:
+            _summary_pending.append((_log_generation, summarize_log_amendment, (log_id, changes)))
+        if not _summary_built:
+            return
+        if _clean_log_value(changes.get('End Time')) == '':
+            # Only closing amendments carry totals; flags on open records (Overbreak, Unclosed) do not
+            return
+        with _index_lock:
+            fields = _index_records.get(int(log_id))
+        if fields is None:
+            app.logger.warning(f"Log ID {log_id} is not indexed; daily summaries skip its amendment.")
+            return
+        values = _summary_contribution(fields['Action'], _clean_log_value(changes.get('Status')),
+                                       _seconds_field(changes, 'Consumed Seconds'), _seconds_field(changes, 'Lateness Seconds'))
+        _summary_add(int(float(fields['Employee ID'])), fields['Date'], values)
+
+
+def _ensure_daily_summaries():
+    if not _summary_built:
+        with _summary_rebuild_lock:
+            if not _summary_built:
+                rebuild_daily_summaries()
+
+
+def get_daily_summary(employee_id, date_str):
+    """Returns the metric totals of one employee on one day."""
+    _ensure_daily_summaries()
+    with _summary_lock:
+        values = _summary_days.get((int(employee_id), date_str), [0] * len(SUMMARY_METRICS))
+        return dict(zip(SUMMARY_METRICS, values))
+
+
+def get_employee_totals(employee_id, start_date=None, end_date=None):
+    """Returns the metric totals of one employee over an inclusive 'YYYY-MM-DD' range from the prefix sums."""
+    _ensure_daily_summaries()
+    with _summary_lock:
+        first_day, prefix = _summary_prefix.get(int(employee_id), (0, [[0] * len(SUMMARY_METRICS)]))
+        start = datetime.strptime(start_date, '%Y-%m-%d').toordinal() - first_day if start_date else 0
+        end = datetime.strptime(end_date, '%Y-%m-%d').toordinal() - first_day + 1 if end_date else len(prefix) - 1
+        start = min(max(start, 0), len(prefix) - 1)
+        end = min(max(end, 0), len(prefix) - 1)
+        if end <= start:
+            return dict.fromkeys(SUMMARY_METRICS, 0)
+        return {metric: prefix[end][k] - prefix[start][k] for k, metric in enumerate(SUMMARY_METRICS)}
+
+
+# Report table cache.
+# The report page loads its rows from /attendance/report/data using the
+# DataTables server-side protocol. The full log is read into one display
+# frame per log generation. Sort orders are computed once per column and
+# reused, so a request filters and slices positions and only the visible
+# page is turned into JSON rows.
+class ReportFrame:
+    """Display-ready log frame (newest first) with cached search text and column sort orders."""
+
+    def __init__(self, df, generation):
+        self.generation = generation
+        frame = df.reset_index(drop=True)
+        # Durations sort by their integer seconds rather than their display text
+        self._sort_keys = {display: frame[column].fillna(-1).astype('int64')
+                           for display, column in DURATION_SECONDS_COLUMNS.items()}
+        self.frame = frame[REPORT_FIELDNAMES].copy()
+        for column in ('ID', 'Employee ID'):
+            if self.frame[column].hasnans:
+                self.frame[column] = self.frame[column].astype(object).where(self.frame[column].notna(), '')
+        # One lowercased string per row for the global search box
+        self.search_text = self.frame.astype(str).apply(lambda column: column.str.lower()).agg('\x1f'.join, axis=1)
+        self._orders = {}
+        self._orders_lock = threading.Lock()
+
+    def order(self, column, ascending):
+        """Returns row positions sorted by one column, computing them on first use."""
+        key = (column, ascending)
+        with self._orders_lock:
+            if key not in self._orders:
+                values = self.sort_key(column)
+                self._orders[key] = values.sort_values(ascending=ascending, kind='mergesort').index.to_numpy()
+            return self._orders[key]
+
+    def sort_key(self, column):
+        """Returns the values a column is sorted by."""
+        if column in self._sort_keys:
+            return self._sort_keys[column]
+        values = self.frame[column]
+        return values.astype(str) if values.dtype == object else values
+
+
+_report_frame = None
+_report_frame_lock = threading.Lock()
+
+
+def get_report_frame():
+    """Returns the cached report frame, re-reading the log only if it changed since the last build."""
+    global _report_frame
+    with _report_frame_lock:
+        generation = _log_generation
+        if _report_frame is None or _report_frame.generation != generation:
+            df = read_log_frame()
+            df = df.sort_values(by='ID', ascending=False)
+            # Replace 'Halfday_Time_In' and 'Halfday_Time_Out' with 'Halfday_Time_In/Halfday_Time_Out'
+            df['Action'] = df['Action'].astype(object).replace(
+                ['Halfday_Time_In', 'Halfday_Time_Out'], 'Halfday_Time_In/Halfday_Time_Out').astype('category')
+            _report_frame = ReportFrame(df, generation)
+        return _report_frame
+
+
+# Response cache.
+# Report data and export bodies are cached under the log generation, so
+# repeated requests between two punches reuse the same bytes. ETags are built
+# from the generation and the cache key, so a matching If-None-Match gets a
+# 304 without building anything; bodies adapted per request carry no ETag. The boot ID keeps ETags from one process
+# run from matching after a restart resets the generation.
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+
+class ResponseCache:
+    """LRU cache of response bodies with a cap on their total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
+
+def response_etag(key, generation):
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+    return f'{_BOOT_ID}-{generation}-{digest}'
+
+
+def not_modified(etag):
+    """Returns a 304 response if the client already holds etag, else None."""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def cached_response(key, build, mimetype, finish=None):
+    """
+    Serves a body built by build() from the response cache under the current log generation.
+    finish(body), if given, adapts the cached body to this request. Such a body differs
+    between requests for the same key, so it is served without an ETag: a browser
+    revalidating with its own copy would get a 304 and keep the stale adaptation.
+    """
+    generation = _log_generation
+    etag = response_etag(key, generation) if finish is None else None
+    response = not_modified(etag) if etag else None
+    if response is None:
+        body = response_cache.get((key, generation))
+        if body is None:
+            body = build()
+            response_cache.put((key, generation), body)
+        response = app.response_class(body if finish is None else finish(body), mimetype=mimetype)
+        if etag:
+            response.set_etag(etag)
+    # Bodies depend on the login, so browsers keep them private and revalidate
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def datatables_page(report_frame, args):
+    """Answers a DataTables server-side request (paging, search, ordering) from the report frame."""
+    frame = report_frame.frame
+    columns = frame.columns.tolist()
+
+    mask = np.ones(len(frame), dtype=bool)
+    search_value = args.get('search[value]', '').strip().lower()
+    if search_value:
+        mask &= report_frame.search_text.str.contains(search_value, regex=False).to_numpy()
+    for i, column in enumerate(columns):
+        column_search = args.get(f'columns[{i}][search][value]', '').strip().lower()
+        if column_search:
+            mask &= frame[column].astype(str).str.lower().str.contains(column_search, regex=False).to_numpy()
+
+    order = []
+    i = 0
+    while f'order[{i}][column]' in args:
+        column_index = args.get(f'order[{i}][column]', type=int)
+        if column_index is not None and 0 <= column_index < len(columns):
+            order.append((columns[column_index], args.get(f'order[{i}][dir]', 'asc') != 'desc'))
+        i += 1
+
+    if not order:
+        positions = np.flatnonzero(mask)  # Newest first, as cached
+    elif len(order) == 1:
+        positions = report_frame.order(*order[0])
+        positions = positions[mask[positions]]
+    else:
+        sort_columns = [report_frame.sort_key(column)[mask] for column, _ in order]
+        keys = pd.concat(sort_columns, axis=1, keys=range(len(order)))
+        positions = keys.sort_values(by=list(range(len(order))), ascending=[asc for _, asc in order], kind='mergesort').index.to_numpy()
+
+    start = max(args.get('start', 0, type=int), 0)
+    length = args.get('length', 10, type=int)
+    page = positions[start:] if length < 0 else positions[start:start + length]
+    rows = frame.iloc[page].astype(object).values.tolist()
+    return {
+        'draw': args.get('draw', 0, type=int),
+        'recordsTotal': len(frame),
+        'recordsFiltered': int(len(positions)),
+        'data': rows,
+    }
+
+
 @app.route('/attendance', methods=['GET'])
 def index():
     employee_list = get_employee_list()
-    return render_template('index.html', employee_list=employee_list)
+    snapshot = reference_data()
+    return render_template('index.html', employee_list=employee_list,
+                           groups=snapshot.groups, break_actions=list(snapshot.time_limits))
 
 @app.route('/attendance/submit', methods=['POST'])
 def submit():
@@ -331,186 +3031,59 @@ def submit():
         return redirect(url_for('index'))
 
     # Validate the employee ID and get the name
-    employee_list = get_employee_list()
-    employee_dict = {emp['ID']: emp['Name'] for emp in employee_list}
+    employee = roster.get(employee_id)
 
-    if employee_id not in employee_dict:
+    if employee is None:
         flash('Invalid employee selected.', 'danger')
         return redirect(url_for('index'))
 
-    name = employee_dict[employee_id]
+    name = employee['Name']
+    settings = reference_data()
 
     timestamp = get_pakistan_time()
     date_str = timestamp.strftime('%Y-%m-%d')
     time_str = timestamp.strftime('%H:%M:%S')
 
     # Define actions that can have duplicates
-    ALLOW_DUPLICATES_ACTIONS = [action.strip().lower() for action in ['halfday_time_in', 'halfday_time_out'] + list(TIME_LIMITS.keys())]
+    ALLOW_DUPLICATES_ACTIONS = [action.strip().lower() for action in ['halfday_time_in', 'halfday_time_out'] + list(settings.time_limits.keys())]
 
     # Duplicate Action Check
     if action.lower() not in ALLOW_DUPLICATES_ACTIONS:
-        if os.path.isfile(LOG_FILE):
-            try:
-                df = pd.read_csv(LOG_FILE, encoding='utf-8')
-                # Fill NaN values
-                df['Action'] = df['Action'].fillna('')
-                df['Date'] = df['Date'].fillna('')
-                df['Employee ID'] = df['Employee ID'].fillna('')
-
-                # Check if the action already exists for the user on the same date
-                mask = (
-                    (df['Employee ID'] == int(employee_id)) &
-                    (df['Date'].str.strip() == date_str) &
-                    (df['Action'].str.lower() == action.lower())
-                )
-                if mask.any():
-                    flash(f"You have already performed '{action}' today.", 'warning')
-                    return redirect(url_for('index'))
-            except Exception as e:
-                app.logger.error(f"Error checking for duplicate action: {e}")
-                flash('Failed to check for duplicate actions.', 'danger')
+        try:
+            # Check if the action already exists for the user on the same date
+            if has_performed_action(employee_id, date_str, action):
+                flash(f"You have already performed '{action}' today.", 'warning')
                 return redirect(url_for('index'))
+        except Exception as e:
+            app.logger.error(f"Error checking for duplicate action: {e}")
+            flash('Failed to check for duplicate actions.', 'danger')
+            return redirect(url_for('index'))
 
 
     BYPASS_TIME_IN_ACTIONS = ['halfday_time_in', 'halfday_time_out']
 
     if action.lower() not in ['time_in'] + BYPASS_TIME_IN_ACTIONS:
         # Check if user has a Time-In entry without End Time
-        if os.path.isfile(LOG_FILE):
-            try:
-                df = pd.read_csv(LOG_FILE, encoding='utf-8')
-                # Fill NaN values
-                df['Action'] = df['Action'].fillna('')
-                df['End Time'] = df['End Time'].fillna('')
-                df['Date'] = df['Date'].fillna('')
-                # Find if there's a Time-In for today without an End Time
-                mask = (
-                    (df['Employee ID'] == int(employee_id)) &
-                    (df['Date'].str.strip() == date_str) &
-                    (df['Action'].str.lower() == 'time_in') &
-                    (df['End Time'].str.strip() == '')
-                )
-                if not mask.any():
-                    flash('You must Time-In before performing other actions.', 'warning')
-                    return redirect(url_for('index'))
-            except Exception as e:
-                app.logger.error(f"Error checking Time-In status: {e}")
-                flash('Failed to check Time-In status.', 'danger')
+        try:
+            if get_open_record_id(employee_id, date_str, 'time_in') is None:
+                flash('You must Time-In before performing other actions.', 'warning')
                 return redirect(url_for('index'))
-        else:
-            flash('You must Time-In before performing other actions.', 'warning')
+        except Exception as e:
+            app.logger.error(f"Error checking Time-In status: {e}")
+            flash('Failed to check Time-In status.', 'danger')
             return redirect(url_for('index'))
 
     if action.lower() == 'time_in':
-        # Existing Time-In logic
-        current_time = timestamp.time()
-
-        # Initialize expected_time_am and expected_time_pm based on group
-        special_expected_time_am = EXPECTED_TIME_IN
-        special_expected_time_pm = PM_EXPECTED_TIME_IN
-
-        # Define group-specific shifts
-        if group == 'hr':
-            if current_time < time(10, 0):
-                special_expected_time_am = time(8, 0)
-                special_expected_time_pm = None  # No PM shift for HR
-            else:
-                special_expected_time_am = time(12, 0)
-                special_expected_time_pm = None
-        elif group in {'mqm', 'mkm', 'trainer'}:
-            special_expected_time_am = time(8, 45)  # Day shift
-            special_expected_time_pm = time(20, 45)  # Night shift
-        elif group == 'office boy':
-            special_expected_time_am = time(9, 0)
-            special_expected_time_pm = time(21, 0)
-        elif group in {'mdm', 'mbm', 'group leader', 'team leader'}:
-            special_expected_time_am = time(8, 15)
-            special_expected_time_pm = time(20, 15)
-        elif group == 'admin':
-            special_expected_time_am = time(11, 0)
-            special_expected_time_pm = time(23, 0)
-
-        # Determine shift and expected time
-        if group == 'hr':
-            if time(6, 0) <= current_time < time(10, 0):
-                expected_time = datetime.combine(timestamp.date(), special_expected_time_am)
-                shift = 'AM Shift'
-            elif time(10, 0) <= current_time < time(18, 0):
-                expected_time = datetime.combine(timestamp.date(), special_expected_time_am)
-                shift = 'Midday Shift'
-            elif PM_SHIFT_START <= current_time <= PM_SHIFT_END:
-                expected_time = None
-                shift = 'No PM Shift'
-            elif current_time < SHIFT_START:
-                if special_expected_time_pm:
-                    expected_time = datetime.combine(timestamp.date() - timedelta(days=1), special_expected_time_pm)
-                    shift = 'PM Shift (after midnight)'
-                else:
-                    expected_time = None
-                    shift = 'No PM Shift'
-            else:
-                expected_time = None
-                shift = 'Unknown'
-        else:
-            if SHIFT_START <= current_time <= SHIFT_END:
-                expected_time = datetime.combine(timestamp.date(), special_expected_time_am)
-                shift = 'AM Shift'
-            elif PM_SHIFT_START <= current_time <= PM_SHIFT_END:
-                expected_time = datetime.combine(timestamp.date(), special_expected_time_pm)
-                shift = 'PM Shift'
-            elif current_time < SHIFT_START:
-                if special_expected_time_pm:
-                    expected_time = datetime.combine(timestamp.date() - timedelta(days=1), special_expected_time_pm)
-                    shift = 'PM Shift (after midnight)'
-                else:
-                    expected_time = None
-                    shift = 'No PM Shift'
-            else:
-                expected_time = None
-                shift = 'Unknown'
-
-        # Check if the user is late or on time
-        if expected_time:
-            expected_time = LOCAL_TIME_ZONE.localize(expected_time)
-            if timestamp > expected_time:
-                status = 'Late'
-                lateness_duration_td = timestamp - expected_time
-                lateness_minutes = int(lateness_duration_td.total_seconds() // 60)
-                lateness_hours = lateness_minutes // 60
-                lateness_remaining_minutes = lateness_minutes % 60
-
-                if lateness_hours > 0:
-                    if lateness_remaining_minutes > 0:
-                        lateness_duration = f'{lateness_hours} hrs & {lateness_remaining_minutes} mins'
-                    else:
-                        lateness_duration = f'{lateness_hours} hrs'
-                else:
-                    lateness_duration = f'{lateness_remaining_minutes} mins'
-            else:
-                status = 'On Time'
-                lateness_duration = ''
-        else:
-            status = 'Invalid Time-In'
-            lateness_duration = ''
-            shift = ''
+        # Classify the punch against the group's shift policy
+        shift, lateness_minutes, status = settings.shift_rules.score_time_in(group, timestamp)
+        lateness_duration = '' if lateness_minutes is None else format_lateness(lateness_minutes)
 
         # Initialize log ID
-        if os.path.isfile(LOG_FILE):
-            try:
-                with open(LOG_FILE, 'r', newline='', encoding='utf-8') as csvfile:
-                    csvreader = csv.reader(csvfile)
-                    next(csvreader, None)  # Skip header
-                    last_id = 0
-                    for row in csvreader:
-                        if row and row[0].isdigit():
-                            last_id = int(row[0])
-                    new_id = last_id + 1
-            except Exception as e:
-                app.logger.error(f"Error reading log file: {e}")
-                flash('Failed to read attendance log.', 'danger')
-                return redirect(url_for('index'))
-        else:
-            new_id = 1
+        try:
+            new_id = get_next_log_id()
+        except Exception:
+            flash('Failed to read attendance log.', 'danger')
+            return redirect(url_for('index'))
 
         # Log the data
         data = {
@@ -525,18 +3098,13 @@ def submit():
             'Time Consumed': '',
             'Shift': shift,
             'Lateness Duration': lateness_duration,
-            'Status': status
+            'Status': status,
+            'Consumed Seconds': '',
+            'Lateness Seconds': '' if lateness_minutes is None else lateness_minutes * 60,
         }
 
-        file_exists = os.path.isfile(LOG_FILE)
-
         try:
-            with open(LOG_FILE, 'a', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['ID', 'Employee ID', 'Name', 'Group', 'Action', 'Date', 'Start Time', 'End Time', 'Time Consumed', 'Shift', 'Lateness Duration', 'Status']
-                csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-                if not file_exists:
-                    csvwriter.writeheader()
-                csvwriter.writerow(data)
+            write_log_record(data)
         except Exception as e:
             app.logger.error(f"Error writing to log file: {e}")
             flash('Failed to record attendance. Please try again.', 'danger')
@@ -563,94 +3131,48 @@ def submit():
 
     elif action.lower() == 'time_out':
         # Check if user has a Time-In entry without End Time
-        if os.path.isfile(LOG_FILE):
-            try:
-                df = pd.read_csv(LOG_FILE, encoding='utf-8')
-                # Fill NaN values
-                df['Action'] = df['Action'].fillna('')
-                df['End Time'] = df['End Time'].fillna('')
-                df['Date'] = df['Date'].fillna('')
-                df['Start Time'] = df['Start Time'].fillna('')
-                # Find the last Time-In entry for this user and date where 'End Time' is empty
-                mask = (
-                    (df['Employee ID'] == int(employee_id)) &
-                    (df['Date'].str.strip() == date_str) &
-                    (df['Action'].str.lower() == 'time_in') &
-                    (df['End Time'].str.strip() == '')
-                )
-                if not mask.any():
-                    flash('Cannot clock out without clocking in first.', 'warning')
-                    return redirect(url_for('index'))
-                else:
-                    # Get index of the entry
-                    idx = df[mask].index[-1]
-                    # Update the entry
-                    end_time_str = time_str
-                    start_time_str = df.loc[idx, 'Start Time']
-                    if not start_time_str:
-                        flash('Start Time is missing for Time-In. Cannot record Time-Out.', 'danger')
-                        return redirect(url_for('index'))
-                    # Parse times
-                    start_time = datetime.strptime(start_time_str, '%H:%M:%S')
-                    end_time = datetime.strptime(end_time_str, '%H:%M:%S')
-                    # If end_time < start_time, it means the end time is on the next day
-                    if end_time < start_time:
-                        end_time += timedelta(days=1)
-                    duration_td = end_time - start_time
-                    duration_seconds = duration_td.total_seconds()
-
-                    # Extract hours, minutes, and seconds
-                    duration_hours = int(duration_seconds // 3600)
-                    duration_remaining_seconds = int(duration_seconds % 3600)
-                    duration_minutes = duration_remaining_seconds // 60
-                    duration_secs = duration_remaining_seconds % 60
-
-                    # Format Time Consumed
-                    duration_str_parts = []
-                    if duration_hours > 0:
-                        duration_str_parts.append(f"{duration_hours} hrs")
-                    if duration_minutes > 0:
-                        duration_str_parts.append(f"{duration_minutes} mins")
-                    if duration_secs > 0:
-                        duration_str_parts.append(f"{duration_secs} secs")
-                    duration_str = ' & '.join(duration_str_parts) if duration_str_parts else '0 secs'
-                    df.loc[idx, 'End Time'] = end_time_str
-                    df.loc[idx, 'Time Consumed'] = duration_str
-                    df.loc[idx, 'Action'] = 'Time_in/Time_out'
-                    # Save the DataFrame back to CSV
-                    df.to_csv(LOG_FILE, index=False, quoting=csv.QUOTE_ALL)
-                    flash(f"Time-Out recorded for {name} on {date_str} at {end_time_str}.", 'info')
+        try:
+            # Find the last Time-In entry for this user and date where 'End Time' is empty
+            log_id = get_open_record_id(employee_id, date_str, 'time_in')
+            if log_id is None:
+                flash('Cannot clock out without clocking in first.', 'warning')
+                return redirect(url_for('index'))
+            else:
+                # Update the entry
+                end_time_str = time_str
+                start_time_str = get_indexed_record(log_id)['Start Time']
+                if not start_time_str:
+                    flash('Start Time is missing for Time-In. Cannot record Time-Out.', 'danger')
                     return redirect(url_for('index'))
-            except Exception as e:
-                app.logger.error(f"Error processing Time-Out: {e}")
-                flash('Failed to record Time-Out. Please try again.', 'danger')
+                # Parse times
+                start_time = datetime.strptime(start_time_str, '%H:%M:%S')
+                end_time = datetime.strptime(end_time_str, '%H:%M:%S')
+                # If end_time < start_time, it means the end time is on the next day
+                if end_time < start_time:
+                    end_time += timedelta(days=1)
+                duration_seconds = int((end_time - start_time).total_seconds())
+                amend_log_record(log_id, {
+                    'End Time': end_time_str,
+                    'Time Consumed': format_duration(duration_seconds),
+                    'Action': 'Time_in/Time_out',
+                    'Consumed Seconds': duration_seconds,
+                })
+                flash(f"Time-Out recorded for {name} on {date_str} at {end_time_str}.", 'info')
                 return redirect(url_for('index'))
-        else:
-            flash('Cannot clock out without clocking in first.', 'warning')
+        except Exception as e:
+            app.logger.error(f"Error processing Time-Out: {e}")
+            flash('Failed to record Time-Out. Please try again.', 'danger')
             return redirect(url_for('index'))
 
-    elif action in TIME_LIMITS:
+    elif action in settings.time_limits:
         # Generate a new log ID
-        if os.path.isfile(LOG_FILE):
-            try:
-                with open(LOG_FILE, 'r', newline='', encoding='utf-8') as csvfile:
-                    csvreader = csv.reader(csvfile)
-                    next(csvreader, None)  # Skip header
-                    last_id = 0
-                    for row in csvreader:
-                        if row and row[0].isdigit():
-                            last_id = int(row[0])
-                    new_id = last_id + 1
-            except Exception as e:
-                app.logger.error(f"Error reading log file: {e}")
-                flash('Failed to record action. Please try again.', 'danger')
-                return redirect(url_for('index'))
-        else:
-            new_id = 1
+        try:
+            new_id = get_next_log_id()
+        except Exception:
+            flash('Failed to record action. Please try again.', 'danger')
+            return redirect(url_for('index'))
 
-        timestamp = get_pakistan_time()
-        date_str = timestamp.strftime('%Y-%m-%d')
-        start_time_str = timestamp.strftime('%H:%M:%S')
+        start_time_str = time_str
 
         # Log the action immediately with Start Time
         data = {
@@ -665,48 +3187,27 @@ def submit():
             'Time Consumed': '',
             'Shift': '',
             'Lateness Duration': '',
-            'Status': ''
+            'Status': '',
+            'Consumed Seconds': '',
+            'Lateness Seconds': '',
         }
 
-        file_exists = os.path.isfile(LOG_FILE)
-
         try:
-            with open(LOG_FILE, 'a', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['ID', 'Employee ID', 'Name', 'Group', 'Action', 'Date', 'Start Time', 'End Time', 'Time Consumed', 'Shift', 'Lateness Duration', 'Status']
-                csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-                if not file_exists:
-                    csvwriter.writeheader()
-                csvwriter.writerow(data)
+            write_log_record(data)
         except Exception as e:
             app.logger.error(f"Error writing to log file: {e}")
             flash('Failed to record action. Please try again.', 'danger')
             return redirect(url_for('index'))
 
-        # Store the log ID and other data in the temp file
-        identifier = str(uuid.uuid4())
-
-        # Ensure temp directory exists
-        TEMP_DIR = os.path.join(BASE_DIR, 'temp')
-        if not os.path.exists(TEMP_DIR):
-            os.makedirs(TEMP_DIR)
-
-        temp_data = {
-            'identifier': identifier,
+        # Register the open break; 'Back to Work' finds it again by its identifier
+        identifier = active_breaks.start({
             'log_id': new_id,
             'employee_id': employee_id,
             'name': name,
             'group': group,
             'action': action,
             'start_time': timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        temp_file_path = os.path.join(TEMP_DIR, f"{identifier}.json")
-        try:
-            with open(temp_file_path, 'w') as temp_file:
-                json.dump(temp_data, temp_file)
-        except Exception as e:
-            app.logger.error(f"Error writing temp file: {e}")
-            flash('Failed to start action. Please try again.', 'danger')
-            return redirect(url_for('index'))
+        })
 
         # Return a page with 'Back to Work' button
         return render_template('back_to_work.html', identifier=identifier, action=action)
@@ -736,16 +3237,536 @@ def handle_break_action(employee_id, name, group, action, timestamp, date_str, t
         'Time Consumed': '',
         'Shift': '',
         'Lateness Duration': '',
-        'Status': ''
+        'Status': '',
+        'Consumed Seconds': '',
+        'Lateness Seconds': '',
     }
 
-    # Append to log.csv
+    # Append to the attendance log
     append_to_log_file(data)
 
     flash(f"Action '{action}' recorded for {name} on {date_str} at {time_str}.", 'info')
     return redirect(url_for('index'))
 
 
+# Active breaks.
+# Open breaks live in memory, keyed by identifier and by employee, so starting
+# and ending one touches no files. A background thread snapshots the registry
+# to ACTIVE_BREAKS_FILE every BREAK_SNAPSHOT_INTERVAL seconds when it changed,
+# and on start-up the snapshot and any legacy temp/<identifier>.json files are
+# loaded back, together with any open break rows of today and yesterday that
+# the last snapshot missed, and the sweeper starts. Breaks left open longer
+# than BREAK_TTL are flagged 'Unclosed' in the log and dropped from the registry.
+class BreakRegistry:
+    """Open breaks by identifier and by employee, with periodic snapshots and a stale-break sweeper."""
+
+    def __init__(self, snapshot_file, legacy_dir, snapshot_interval, ttl):
+        self.snapshot_file = snapshot_file
+        self.legacy_dir = legacy_dir
+        self.snapshot_interval = snapshot_interval
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._breaks = None               # identifier -> break entry, loaded on first use
+        self._by_employee = {}            # employee ID -> set of identifiers
+        self._dirty = False
+        self._thread = None
+
+    def _add(self, entry):
+        self._breaks[entry['identifier']] = entry
+        self._by_employee.setdefault(int(entry['employee_id']), set()).add(entry['identifier'])
+
+    def _remove(self, identifier):
+        entry = self._breaks.pop(identifier, None)
+        if entry is not None:
+            identifiers = self._by_employee.get(int(entry['employee_id']), set())
+            identifiers.discard(identifier)
+            if not identifiers:
+                self._by_employee.pop(int(entry['employee_id']), None)
+        return entry
+
+    def load(self):
+        """Loads the registry and arms the overbreak timers of its open breaks, once."""
+        self._load()
+
+    def _load(self):
+        with self._lock:
+            if self._breaks is not None:
+                return
+            self._breaks = {}
+            if os.path.isfile(self.snapshot_file):
+                try:
+                    with open(self.snapshot_file, 'r', encoding='utf-8') as snapshot:
+                        for entry in json.load(snapshot):
+                            self._add(entry)
+                except Exception as e:
+                    app.logger.error(f"Error reading active breaks snapshot: {e}")
+            self._import_legacy_files()
+            self._recover_open_rows()
+            now = get_pakistan_time()
+            for entry in self._breaks.values():
+                # Breaks past the TTL are left to the sweeper, so they end up 'Unclosed' rather than 'Overbreak'
+                if not entry.get('overbreak') and not self._is_stale(entry, now):
+                    overbreak_timers.arm(entry)
+            app.logger.info(f"Active break registry loaded with {len(self._breaks)} open breaks.")
+        self._ensure_started()
+
+    def _recover_open_rows(self):
+        """Registers open break rows that are in the log but not in the registry, e.g. after a crash."""
+        try:
+            today = get_pakistan_time()
+            df = read_log_frame((today - timedelta(days=1)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'),
+                                columns=['ID', 'Employee ID', 'Name', 'Group', 'Action', 'Date', 'Start Time', 'End Time', 'Status'])
+        except Exception as e:
+            app.logger.error(f"Error reading open breaks from the log: {e}")
+            return
+        known = {int(entry['log_id']) for entry in self._breaks.values()}
+        df = df[(df['End Time'] == '') & (df['Status'] != 'Unclosed')
+                & df['Action'].isin(list(reference_data().time_limits)) & ~df['ID'].isin(known)]
+        for record in df.to_dict('records'):
+            self._add({
+                'identifier': str(uuid.uuid4()),
+                'log_id': int(record['ID']),
+                'employee_id': f"{int(record['Employee ID']):04}",
+                'name': record['Name'],
+                'group': record['Group'].lower(),
+                'action': record['Action'],
+                'start_time': f"{record['Date']} {record['Start Time']}",
+                'overbreak': record['Status'] == 'Overbreak',
+            })
+            self._dirty = True
+        if len(df):
+            app.logger.warning(f"Recovered {len(df)} open breaks from the log that were missing from the snapshot.")
+
+    def _import_legacy_files(self):
+        """Moves per-break JSON files written by earlier versions into the registry."""
+        if not os.path.isdir(self.legacy_dir):
+            return
+        for filename in sorted(os.listdir(self.legacy_dir)):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.legacy_dir, filename)
+            try:
+                with open(path, 'r', encoding='utf-8') as legacy_file:
+                    entry = json.load(legacy_file)
+                entry.setdefault('identifier', filename[:-5])
+                if entry.get('log_id') is None:
+                    # Files from before log IDs were stored: find the open row they belong to
+                    entry['log_id'] = get_open_record_id(entry['employee_id'], entry['start_time'][:10], entry['action'])
+                if entry['log_id'] is None:
+                    app.logger.warning(f"Dropping break file {filename}: no open log row for "
+                                       f"{entry.get('name')} / {entry.get('action')} at {entry.get('start_time')}.")
+                else:
+                    self._add(entry)
+                    self._dirty = True
+                os.remove(path)
+            except Exception as e:
+                app.logger.error(f"Error importing break file {filename}: {e}")
+
+    def start(self, entry):
+        """Registers an open break and returns its new identifier."""
+        self._load()
+        entry = dict(entry, identifier=str(uuid.uuid4()))
+        with self._lock:
+            # Loading may already have recovered this row from the log
+            for identifier in list(self._by_employee.get(int(entry['employee_id']), ())):
+                if self._breaks[identifier]['log_id'] == entry['log_id']:
+                    overbreak_timers.cancel(identifier)
+                    self._remove(identifier)
+            self._add(entry)
+            self._dirty = True
+        overbreak_timers.arm(entry)
+        live_dashboard.notify()
+        return entry['identifier']
+
+    def claim(self, identifier):
+        """Removes and returns the open break with this identifier, or None."""
+        self._load()
+        with self._lock:
+            entry = self._remove(identifier)
+            if entry is not None:
+                self._dirty = True
+        overbreak_timers.cancel(identifier)
+        live_dashboard.notify()
+        return entry
+
+    def restore(self, entry):
+        """Puts back a break whose closing failed."""
+        with self._lock:
+            self._add(entry)
+            self._dirty = True
+        if not entry.get('overbreak'):
+            overbreak_timers.arm(entry)
+        live_dashboard.notify()
+
+    def flag_overbreak(self, identifier):
+        """Marks an open break as over its limit; returns a copy of it, or None if it is closed or already marked."""
+        self._load()
+        with self._lock:
+            entry = self._breaks.get(identifier)
+            if entry is None or entry.get('overbreak'):
+                return None
+            entry['overbreak'] = True
+            self._dirty = True
+            return dict(entry)
+
+    def for_employee(self, employee_id):
+        """Returns the open breaks of one employee, oldest first."""
+        self._load()
+        with self._lock:
+            entries = [self._breaks[identifier] for identifier in self._by_employee.get(int(employee_id), ())]
+        return sorted(entries, key=lambda entry: entry['start_time'])
+
+    def active(self):
+        """Returns every open break, oldest first."""
+        self._load()
+        with self._lock:
+            return sorted(self._breaks.values(), key=lambda entry: entry['start_time'])
+
+    def snapshot(self):
+        """Writes the registry to the snapshot file if it changed since the last write."""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = list(self._breaks.values())
+            self._dirty = False
+        try:
+            tmp_file = self.snapshot_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as snapshot:
+                json.dump(entries, snapshot)
+            os.replace(tmp_file, self.snapshot_file)
+        except Exception as e:
+            with self._lock:
+                self._dirty = True
+            app.logger.error(f"Error writing active breaks snapshot: {e}")
+
+    def _is_stale(self, entry, now):
+        start = LOCAL_TIME_ZONE.localize(datetime.strptime(entry['start_time'], '%Y-%m-%d %H:%M:%S'))
+        return (now - start).total_seconds() > self.ttl
+
+    def sweep(self):
+        """Flags breaks open for longer than the TTL as 'Unclosed' and drops them; returns how many."""
+        now = get_pakistan_time()
+        with self._lock:
+            stale = [identifier for identifier, entry in self._breaks.items() if self._is_stale(entry, now)]
+            entries = [self._remove(identifier) for identifier in stale]
+            if entries:
+                self._dirty = True
+                live_dashboard.notify()
+        for entry in entries:
+            overbreak_timers.cancel(entry['identifier'])
+            try:
+                amend_log_record(entry['log_id'], {'Status': 'Unclosed'})
+                app.logger.warning(f"Break '{entry['action']}' of {entry['name']} started {entry['start_time']} "
+                                   f"was never closed; flagged log ID {entry['log_id']} as Unclosed.")
+            except Exception as e:
+                app.logger.error(f"Error flagging unclosed break {entry['log_id']}: {e}")
+        return len(entries)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='active-breaks', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        # The first sweep runs right away, for breaks that passed the TTL while the app was down
+        while True:
+            try:
+                self.sweep()
+                self.snapshot()
+            except Exception as e:
+                app.logger.error(f"Error maintaining active breaks: {e}")
+            sleep(self.snapshot_interval)
+
+
+active_breaks = BreakRegistry(ACTIVE_BREAKS_FILE, LEGACY_BREAK_DIR, BREAK_SNAPSHOT_INTERVAL, BREAK_TTL)
+
+
+# Overbreak timers.
+# Each open break arms a deadline (its start plus its break limit) in a min-heap
+# served by one thread, which sleeps until the earliest deadline. When one
+# passes, the log row is flagged 'Overbreak' right away, the dashboard is
+# pushed, and OVERBREAK_WEBHOOK_URL is notified if set. Closing a break only
+# drops its deadline from a map; its heap entry is discarded when it comes up.
+# The registry, loaded at start-up, arms every open break it loads, so timers
+# survive restarts.
+class OverbreakTimers:
+    """Min-heap of break deadlines that flags breaks the moment they exceed their limit."""
+
+    def __init__(self, max_wait, webhook_url):
+        self.max_wait = max_wait
+        self.webhook_url = webhook_url
+        self._condition = threading.Condition()
+        self._heap = []                   # (deadline timestamp, identifier)
+        self._deadlines = {}              # identifier -> armed deadline; other heap entries are stale
+        self._thread = None
+        self._hooks = ThreadPoolExecutor(max_workers=1, thread_name_prefix='overbreak-hook') if webhook_url else None
+
+    def arm(self, entry):
+        """Schedules the overbreak deadline of an open break."""
+        settings = reference_data()
+        limit = settings.shift_rules.break_limit(entry['group'], entry['action'], settings.time_limits) * 60
+        start = LOCAL_TIME_ZONE.localize(datetime.strptime(entry['start_time'], '%Y-%m-%d %H:%M:%S'))
+        deadline = start.timestamp() + limit
+        with self._condition:
+            self._deadlines[entry['identifier']] = deadline
+            heapq.heappush(self._heap, (deadline, entry['identifier']))
+            if self._heap[0][1] == entry['identifier']:
+                self._condition.notify()
+        self._ensure_started()
+
+    def cancel(self, identifier):
+        """Drops the deadline of a break that was closed."""
+        with self._condition:
+            self._deadlines.pop(identifier, None)
+
+    def pending(self):
+        """Returns the number of armed deadlines."""
+        with self._condition:
+            return len(self._deadlines)
+
+    def _pop_due(self):
+        """Pops the breaks whose deadline has passed; returns them and how long to sleep. Caller holds the condition."""
+        now = get_pakistan_time().timestamp()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, identifier = heapq.heappop(self._heap)
+            if self._deadlines.get(identifier) == deadline:
+                del self._deadlines[identifier]
+                due.append(identifier)
+        wait = self._heap[0][0] - now if self._heap else self.max_wait
+        return due, min(wait, self.max_wait)
+
+    def _fire(self, identifier):
+        entry = active_breaks.flag_overbreak(identifier)
+        if entry is None:
+            return
+        amend_log_record(entry['log_id'], {'Status': 'Overbreak'})
+        app.logger.warning(f"{entry['name']} has been on '{entry['action']}' since {entry['start_time']} "
+                           f"and is over the limit; flagged log ID {entry['log_id']} as Overbreak.")
+        live_dashboard.notify()
+        if self._hooks is not None:
+            self._hooks.submit(self._post_webhook, entry)
+
+    def _post_webhook(self, entry):
+        try:
+            requests.post(self.webhook_url, json=entry, timeout=5).raise_for_status()
+        except Exception as e:
+            app.logger.error(f"Error posting overbreak webhook for log ID {entry['log_id']}: {e}")
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._condition:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='overbreak-timers', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due, wait = self._pop_due()
+                if not due:
+                    self._condition.wait(max(wait, 0))
+                    continue
+            for identifier in due:
+                try:
+                    self._fire(identifier)
+                except Exception as e:
+                    app.logger.error(f"Error flagging overbreak for break {identifier}: {e}")
+
+
+overbreak_timers = OverbreakTimers(OVERBREAK_MAX_WAIT, OVERBREAK_WEBHOOK_URL)
+
+
+# Live dashboard.
+# Who is clocked in is tracked from the log writer's appends and amendments
+# (seeded once from today's and yesterday's log), and who is on break comes
+# from the active break registry, so building the state never re-reads the log.
+# One broadcaster thread rebuilds and serializes the state whenever a punch
+# changes it, or every DASHBOARD_TICK_INTERVAL seconds so elapsed times and
+# over-limit flags move on, and hands the same payload to every viewer's queue.
+PRESENCE_ACTIONS = ('time_in', 'halfday_time_in')
+
+
+class LiveDashboard:
+    """In-process state of who is clocked in and on break, fanned out to event-stream viewers."""
+
+    def __init__(self, tick_interval):
+        self.tick_interval = tick_interval
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._load_lock = threading.Lock()
+        self._present = None              # log ID -> open Time-In / Halfday Time-In, loaded on first use
+        self._pending = None              # updates committed while the seed read runs
+        self._viewers = set()             # one single-slot queue per connected viewer
+        self._thread = None
+
+    @staticmethod
+    def _presence_entry(record):
+        date_str = _clean_log_value(record.get('Date'))
+        return {
+            'employee_id': f"{int(float(_clean_log_value(record.get('Employee ID')))):04}",
+            'name': _clean_log_value(record.get('Name')),
+            'group': _clean_log_value(record.get('Group')),
+            'halfday': _clean_log_value(record.get('Action')).lower() == 'halfday_time_in',
+            'date': date_str,
+            'start_time': f"{date_str} {_clean_log_value(record.get('Start Time'))}",
+        }
+
+    def _load(self):
+        # The seed read does not block writers; punches committed after the generation
+        # it reflects are queued meanwhile and applied on top of it
+        with self._load_lock:
+            with self._lock:
+                if self._present is not None:
+                    return
+                self._pending = []
+            today = get_pakistan_time()
+            try:
+                df, generation = read_log_frame_at(
+                    (today - timedelta(days=1)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'),
+                    columns=['ID', 'Employee ID', 'Name', 'Group', 'Action', 'Date', 'Start Time', 'End Time'])
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            df = df[(df['End Time'] == '') & df['Action'].astype(str).str.lower().isin(PRESENCE_ACTIONS)]
+            present = {int(record['ID']): self._presence_entry(record) for record in df.to_dict('records')}
+            with self._lock:
+                pending, self._pending = self._pending, None
+                if pending is None:
+                    # Invalidated while reading; the next use reloads
+                    return
+                self._present = present
+                for committed_at, update, args in pending:
+                    if committed_at >= generation:
+                        update(*args)
+
+    def _track_append(self, record):
+        if _clean_log_value(record.get('Action')).lower() in PRESENCE_ACTIONS and _clean_log_value(record.get('End Time')) == '':
+            self._present[int(float(_clean_log_value(record.get('ID'))))] = self._presence_entry(record)
+
+    def _track_amendment(self, log_id, changes):
+        if _clean_log_value(changes.get('End Time')) != '':
+            self._present.pop(int(log_id), None)
+
+    def _track(self, update, *args):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((_log_generation, update, args))
+            elif self._present is not None:
+                update(*args)
+        self._changed.set()
+
+    def record_appended(self, record):
+        """Tracks a newly written log record; caller holds _log_write_lock."""
+        self._track(self._track_append, record)
+
+    def record_amended(self, log_id, changes):
+        """Drops a Time-In once an amendment closes it; caller holds _log_write_lock."""
+        self._track(self._track_amendment, log_id, changes)
+
+    def invalidate(self):
+        """Forgets the tracked state after the log was rewritten; it is reloaded on next use."""
+        with self._lock:
+            self._present = None
+            self._pending = None
+        self._changed.set()
+
+    def notify(self):
+        """Asks the broadcaster to push a fresh state."""
+        self._changed.set()
+
+    def state(self):
+        """Builds the current dashboard state as a JSON-serializable dictionary."""
+        self._load()
+        now = get_pakistan_time()
+        since = (now - timedelta(days=1)).strftime('%Y-%m-%d')
+        with self._lock:
+            present = [dict(entry) for entry in (self._present or {}).values() if entry['date'] >= since]
+        for entry in present:
+            del entry['date']
+            start = LOCAL_TIME_ZONE.localize(datetime.strptime(entry['start_time'], '%Y-%m-%d %H:%M:%S'))
+            entry['elapsed_seconds'] = max(int((now - start).total_seconds()), 0)
+        settings = reference_data()
+        on_break = []
+        for entry in active_breaks.active():
+            start = LOCAL_TIME_ZONE.localize(datetime.strptime(entry['start_time'], '%Y-%m-%d %H:%M:%S'))
+            elapsed = max(int((now - start).total_seconds()), 0)
+            limit = settings.shift_rules.break_limit(entry['group'], entry['action'], settings.time_limits) * 60
+            on_break.append({
+                'employee_id': entry['employee_id'],
+                'name': entry['name'],
+                'group': entry['group'].upper(),
+                'action': entry['action'],
+                'start_time': entry['start_time'],
+                'elapsed_seconds': elapsed,
+                'limit_seconds': limit,
+                'over': elapsed > limit,
+            })
+        return {
+            'generated_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'clocked_in': sorted(present, key=lambda entry: entry['start_time']),
+            'on_break': on_break,
+            'over_limit': sum(entry['over'] for entry in on_break),
+        }
+
+    def subscribe(self):
+        """Registers a viewer and returns its queue, already holding the current state."""
+        viewer = queue.Queue(maxsize=1)
+        payload = json.dumps(self.state())
+        with self._lock:
+            self._viewers.add(viewer)
+        self._offer(viewer, payload)
+        self._ensure_started()
+        return viewer
+
+    def unsubscribe(self, viewer):
+        with self._lock:
+            self._viewers.discard(viewer)
+
+    @staticmethod
+    def _offer(viewer, payload):
+        # A viewer only needs the newest state, so a slow one has its unread state replaced
+        try:
+            viewer.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            viewer.put_nowait(payload)
+        except queue.Full:
+            pass
+
+    def _publish(self):
+        payload = json.dumps(self.state())
+        with self._lock:
+            viewers = list(self._viewers)
+        for viewer in viewers:
+            self._offer(viewer, payload)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='live-dashboard', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._changed.wait(self.tick_interval)
+            self._changed.clear()
+            if not self._viewers:
+                continue
+            try:
+                self._publish()
+            except Exception as e:
+                app.logger.error(f"Error publishing dashboard state: {e}")
+
+
+live_dashboard = LiveDashboard(DASHBOARD_TICK_INTERVAL)
+
+
 # New route to handle 'Back to Work'
 @app.route('/attendance/back_to_work', methods=['POST'])
 def back_to_work():
@@ -754,28 +3775,19 @@ def back_to_work():
         flash('Invalid request. Missing identifier.', 'danger')
         return redirect(url_for('index'))
 
-    # Read the temp file
-    TEMP_DIR = os.path.join(BASE_DIR, 'temp')
-    temp_file_path = os.path.join(TEMP_DIR, f"{identifier}.json")
-    if not os.path.exists(temp_file_path):
+    # Claim the open break, so a second click cannot close it twice
+    break_data = active_breaks.claim(identifier)
+    if break_data is None:
         flash('Session expired or invalid identifier.', 'danger')
         return redirect(url_for('index'))
 
-    try:
-        with open(temp_file_path, 'r') as temp_file:
-            temp_data = json.load(temp_file)
-    except Exception as e:
-        app.logger.error(f"Error reading temp file: {e}")
-        flash('Failed to retrieve action data.', 'danger')
-        return redirect(url_for('index'))
-
     # Get the data
-    log_id = temp_data['log_id']
-    employee_id = temp_data['employee_id']
-    name = temp_data['name']
-    group = temp_data['group']
-    action = temp_data['action']
-    start_time_str = temp_data['start_time']
+    log_id = break_data['log_id']
+    employee_id = break_data['employee_id']
+    name = break_data['name']
+    group = break_data['group']
+    action = break_data['action']
+    start_time_str = break_data['start_time']
 
     # Parse start time
     start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S')
@@ -785,109 +3797,81 @@ def back_to_work():
     end_time = get_pakistan_time()
 
     # Calculate duration
-    duration_td = end_time - start_time
-    duration_seconds = duration_td.total_seconds()
-
-    # Extract hours, minutes, and seconds
-    duration_hours = int(duration_seconds // 3600)
-    duration_remaining_seconds = int(duration_seconds % 3600)
-    duration_minutes = duration_remaining_seconds // 60
-    duration_secs = duration_remaining_seconds % 60
+    duration_seconds = (end_time - start_time).total_seconds()
 
     # Compare with time limit
-    time_limit = TIME_LIMITS.get(action, 0)  # Time limit in minutes
+    settings = reference_data()
+    time_limit = settings.shift_rules.break_limit(group, action, settings.time_limits)  # Time limit in minutes
     time_limit_seconds = time_limit * 60
 
     if duration_seconds <= time_limit_seconds:
         status = 'On Time'
+        lateness_seconds = ''
         lateness_duration = ''
     else:
         status = 'Overbreak'
-        overbreak_seconds = duration_seconds - time_limit_seconds
-        # Calculate overbreak hours, minutes, and seconds
-        lateness_hours = int(overbreak_seconds // 3600)
-        lateness_remaining_seconds = int(overbreak_seconds % 3600)
-        lateness_minutes = lateness_remaining_seconds // 60
-        lateness_secs = lateness_remaining_seconds % 60
-
-        # Format lateness_duration
-        parts = []
-        if lateness_hours > 0:
-            parts.append(f"{lateness_hours} hrs")
-        if lateness_minutes > 0:
-            parts.append(f"{lateness_minutes} mins")
-        if lateness_secs > 0:
-            parts.append(f"{lateness_secs} secs")
-        lateness_duration = ' & '.join(parts)
+        lateness_seconds = int(duration_seconds - time_limit_seconds)
+        lateness_duration = format_duration(lateness_seconds) if lateness_seconds else ''
 
     # Prepare data to log
     date_str = start_time.strftime('%Y-%m-%d')
     end_time_str = end_time.strftime('%H:%M:%S')
-    duration_str_parts = []
-    if duration_hours > 0:
-        duration_str_parts.append(f"{duration_hours} hrs")
-    if duration_minutes > 0:
-        duration_str_parts.append(f"{duration_minutes} mins")
-    if duration_secs > 0:
-        duration_str_parts.append(f"{duration_secs} secs")
-    duration_str = ' & '.join(duration_str_parts) if duration_str_parts else '0 secs'
-
-    # Initialize log ID
-    if os.path.isfile(LOG_FILE):
-        try:
-            with open(LOG_FILE, 'r', newline='', encoding='utf-8') as csvfile:
-                csvreader = csv.reader(csvfile)
-                next(csvreader, None)  # Skip header
-                last_id = 0
-                for row in csvreader:
-                    if row and row[0].isdigit():
-                        last_id = int(row[0])
-                # Ensure unique ID
-                new_id = last_id + 1
-        except Exception as e:
-            app.logger.error(f"Error reading log file: {e}")
-            flash('Failed to read attendance log.', 'danger')
-            return redirect(url_for('index'))
-    else:
-        new_id = 1
+    duration_str = format_duration(duration_seconds)
 
-    # Read the log CSV into a DataFrame
+    # Find the log entry by ID
     try:
-        df = pd.read_csv(LOG_FILE, encoding='utf-8')
+        if get_indexed_record(log_id) is None:
+            active_breaks.restore(break_data)
+            flash('Log entry not found. Cannot update.', 'danger')
+            return redirect(url_for('index'))
     except Exception as e:
         app.logger.error(f"Error reading log file: {e}")
+        active_breaks.restore(break_data)
         flash('Failed to read attendance log.', 'danger')
         return redirect(url_for('index'))
 
-    # Find the log entry by ID
-    mask = df['ID'] == log_id
-    if not mask.any():
-        flash('Log entry not found. Cannot update.', 'danger')
-        return redirect(url_for('index'))
-
     # Update the entry
-    df.loc[mask, 'End Time'] = end_time_str
-    df.loc[mask, 'Time Consumed'] = duration_str
-    df.loc[mask, 'Lateness Duration'] = lateness_duration
-    df.loc[mask, 'Status'] = status
-
-    # Save the DataFrame back to CSV
     try:
-        df.to_csv(LOG_FILE, index=False, quoting=csv.QUOTE_ALL)
+        amend_log_record(log_id, {
+            'End Time': end_time_str,
+            'Time Consumed': duration_str,
+            'Lateness Duration': lateness_duration,
+            'Status': status,
+            'Consumed Seconds': int(duration_seconds),
+            'Lateness Seconds': lateness_seconds,
+        })
     except Exception as e:
         app.logger.error(f"Error updating log file: {e}")
+        active_breaks.restore(break_data)
         flash('Failed to update action. Please try again.', 'danger')
         return redirect(url_for('index'))
 
-    # Delete the temp file
-    try:
-        os.remove(temp_file_path)
-    except Exception as e:
-        app.logger.error(f"Error deleting temp file: {e}")
-
     flash(f"Action '{action}' completed. You spent {duration_str}. Status: {status}.", 'info')
     return redirect(url_for('index'))
 
+@app.route('/attendance/dashboard', methods=['GET'])
+@login_required
+def dashboard():
+    return render_template('dashboard.html')
+
+@app.route('/attendance/dashboard/stream', methods=['GET'])
+@login_required
+def dashboard_stream():
+    """Server-Sent Events stream of the live dashboard state."""
+    def events():
+        viewer = live_dashboard.subscribe()
+        try:
+            while True:
+                try:
+                    yield f"data: {viewer.get(timeout=DASHBOARD_KEEPALIVE)}\n\n"
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            live_dashboard.unsubscribe(viewer)
+
+    return app.response_class(events(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 
 
 @app.route('/attendance/login', methods=['GET', 'POST'])
@@ -994,127 +3978,207 @@ def manage_sub_keys():
 @app.route('/attendance/report')
 @login_required
 def report():
-    if os.path.isfile(LOG_FILE):
-        try:
-            df = pd.read_csv(LOG_FILE, encoding='utf-8')
-            df = df.fillna('')  # Replace NaN with empty string
-            df = df.sort_values(by='ID', ascending=False)
-            data = df.values.tolist()
-            headers = df.columns.tolist()
+    # ?full=1 streams every row as a printable page instead of the paged table
+    if request.args.get('full') == '1':
+        # The page is streamed, not cached, but an unchanged log still answers 304
+        etag = response_etag('report-full', _log_generation)
+        response = not_modified(etag) or app.response_class(
+            stream_template('report_full.html', headers=REPORT_FIELDNAMES, rows=iter_report_rows()))
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    # Rows are loaded page by page from report_data()
+    headers = REPORT_FIELDNAMES if storage.has_log() else []
+    return render_template('report.html', headers=headers, groups=reference_data().groups)
+
+
+def iter_report_rows():
+    """Yields report rows in log order straight from storage, so the full report never sits in memory."""
+    if not storage.has_log():
+        return
+    try:
+        for record in storage.iter_log_records():
+            if record.get('Action') in ['Halfday_Time_In', 'Halfday_Time_Out']:
+                record['Action'] = 'Halfday_Time_In/Halfday_Time_Out'
+            yield ['' if record.get(field) is None else record.get(field) for field in REPORT_FIELDNAMES]
+    except Exception as e:
+        # Headers are already sent, so the page simply ends here
+        app.logger.error(f"Error streaming log file: {e}")
 
-            # Identify the index of the 'Action' column
-            try:
-                action_idx = headers.index('Action')
-            except ValueError:
-                app.logger.error("'Action' column not found in the log file.")
-                flash("'Action' column is missing from the log data.", 'danger')
-                data = []
-                headers = []
-                return render_template('report.html', data=data, headers=headers)
 
-            # Replace 'Halfday_Time_In' and 'Halfday_Time_Out' with 'Halfday_Time_In/Halfday_Time_Out'
-            for row in data:
-                if row[action_idx] in ['Halfday_Time_In', 'Halfday_Time_Out']:
-                    row[action_idx] = 'Halfday_Time_In/Halfday_Time_Out'
+@app.route('/attendance/report/data')
+@login_required
+def report_data():
+    try:
+        if not storage.has_log():
+            return jsonify({'draw': request.args.get('draw', 0, type=int), 'recordsTotal': 0,
+                            'recordsFiltered': 0, 'data': []})
+        # DataTables sends a new draw counter and jQuery cache-buster with every request;
+        # they are left out of the key and the draw is written in after the cache lookup.
+        # DataTables drops responses with an old draw, so this endpoint sends no ETag
+        draw = request.args.get('draw', 0, type=int)
+        key = ('report-data', tuple(sorted((name, value) for name, value in request.args.items(multi=True)
+                                           if name not in ('draw', '_'))))
+
+        def build():
+            page = datatables_page(get_report_frame(), request.args)
+            page.pop('draw', None)
+            return json.dumps(page).encode('utf-8')
+
+        return cached_response(key, build, 'application/json',
+                               finish=lambda body: b'{"draw": %d, ' % draw + body[1:])
+    except Exception as e:
+        app.logger.error(f"Error reading log file: {e}")
+        return jsonify({'draw': request.args.get('draw', 0, type=int), 'error': 'Failed to load attendance data.'}), 500
+
+
+# Excel export.
+# The workbook is written in openpyxl write-only mode while the log streams
+# from storage, newest first, in chunks of EXPORT_CHUNK_ROWS. Each chunk is
+# split into sheets and its Status column is mapped to row fills in one
+# vectorized pass; only highlighted rows are written as styled cells.
+HALFDAY_ACTIONS = ["Halfday_Time_In", "Halfday_Time_Out", "Halfday_Time_In/Halfday_Time_Out"]
+EXPORT_SHEETS = {'attendance': 'Attendance', 'breaks': 'Breaks', 'halfday': 'Halfday'}
+EXPORT_FILLS = {
+    'late': PatternFill(start_color='FDEF81', end_color='FDEF81', fill_type='solid'),      # Light yellow fill
+    'overbreak': PatternFill(start_color='FF9999', end_color='FF9999', fill_type='solid'),  # Light red fill
+}
 
-        except Exception as e:
-            app.logger.error(f"Error reading log file: {e}")
-            flash('Failed to load attendance data.', 'danger')
-            data = []
-            headers = []
-    else:
-        data = []
-        headers = []
 
-    return render_template('report.html', data=data, headers=headers)
+def _export_chunk(records):
+    """Builds a typed DataFrame from a chunk of log records, as the report shows them."""
+    df = pd.DataFrame.from_records(records, columns=REPORT_FIELDNAMES)
+    df = df.astype(object).where(df.notna(), '')  # Replace NaN/None with empty string
+    for column in ('ID', 'Employee ID'):
+        numbers = pd.to_numeric(df[column], errors='coerce')
+        df[column] = [int(number) if not pd.isna(number) else value for number, value in zip(numbers, df[column])]
+    return df
 
 
-@app.route('/attendance/export')
-@login_required
-def export():
-    if os.path.isfile(LOG_FILE):
-        try:
-            # Read the log CSV into a DataFrame
-            df = pd.read_csv(LOG_FILE, encoding='utf-8')
-            df = df.fillna('')  # Replace NaN with empty string
-            df = df.sort_values(by='ID', ascending=False)
+def _append_export_rows(sheet, df, fills):
+    """Appends DataFrame rows to a write-only sheet, styling the rows that have a fill."""
+    for values, fill in zip(df.itertuples(index=False, name=None), fills):
+        if fill is None:
+            sheet.append(values)
+            continue
+        row = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.fill = fill
+            row.append(cell)
+        sheet.append(row)
 
-            # Define break actions
-            BREAK_ACTIONS = ["Recite Sutra", "Toilet", "Smoke", "BREAK1", "BREAK2"]
-            HALFDAY_ACTIONS = ["Halfday_Time_In", "Halfday_Time_Out"]
 
-            # Separate regular attendance and breaks
-            attendance_df = df[~df['Action'].isin(BREAK_ACTIONS + HALFDAY_ACTIONS)]
-            breaks_df = df[df['Action'].isin(BREAK_ACTIONS)]
-            halfday_df = df[df['Action'].isin(HALFDAY_ACTIONS)]
+def export_break_actions():
+    return set(TIME_LIMITS) | set(reference_data().time_limits)
 
-            # Create a BytesIO buffer to hold the Excel file in memory
-            output = BytesIO()
 
-            # Use ExcelWriter with openpyxl engine
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                # Write regular attendance to 'Attendance' sheet
-                attendance_df.to_excel(writer, index=False, sheet_name='Attendance')
-
-                # Write breaks to 'Breaks' sheet
-                breaks_df.to_excel(writer, index=False, sheet_name='Breaks')
-
-                # Write half-day actions to 'Halfday' sheet
-                halfday_df.to_excel(writer, index=False, sheet_name='Halfday')
-
-                # Access the workbook and worksheets
-                workbook = writer.book
-                attendance_sheet = writer.sheets['Attendance']
-                breaks_sheet = writer.sheets['Breaks']
-
-                # Define the fills for highlighting
-                late_fill = PatternFill(start_color='FDEF81', end_color='FDEF81', fill_type='solid')  # Light yellow fill
-                overbreak_fill = PatternFill(start_color='FF9999', end_color='FF9999', fill_type='solid')  # Light red fill
-
-                # Function to apply conditional formatting
-                def apply_conditional_formatting(sheet, status_column):
-                    for row_idx, status in enumerate(sheet.iter_rows(min_row=2, max_col=sheet.max_column, max_row=sheet.max_row), start=2):
-                        cell_status = sheet.cell(row=row_idx, column=sheet.max_row).value  # Assuming 'Status' is the last column
-                        fill = None
-                        if str(status).strip().lower() == 'late':
-                            fill = late_fill
-                        elif str(status).strip().lower() == 'overbreak':
-                            fill = overbreak_fill
-
-                        if fill:
-                            for col in range(1, sheet.max_column + 1):
-                                cell = sheet.cell(row=row_idx, column=col)
-                                cell.fill = fill
-
-                # Apply formatting to 'Attendance' sheet
-                if 'Status' in attendance_df.columns:
-                    apply_conditional_formatting(attendance_sheet, 'Status')
-                else:
-                    app.logger.error("'Status' column not found in the Attendance sheet.")
-                    flash("'Status' column is missing from the Attendance data.", 'danger')
-                    return redirect(url_for('report'))
+def write_export_workbook(output, records, action_class=None, progress=None):
+    """
+    Writes log records into an Attendance/Breaks/Halfday workbook on a binary file object.
+    action_class ('attendance', 'breaks' or 'halfday') limits the workbook to that sheet;
+    progress, if given, is called with the number of records written after each chunk.
+    """
+    break_actions = export_break_actions()
+    workbook = Workbook(write_only=True)
+    names = [EXPORT_SHEETS[action_class]] if action_class else list(EXPORT_SHEETS.values())
+    sheets = {name: workbook.create_sheet(name) for name in names}
+    for sheet in sheets.values():
+        sheet.append(REPORT_FIELDNAMES)
+
+    records = iter(records)
+    written = 0
+    while True:
+        chunk = list(itertools.islice(records, EXPORT_CHUNK_ROWS))
+        if not chunk:
+            break
+        df = _export_chunk(chunk)
+        status = df['Status'].astype(str).str.strip().str.lower()
+        fills = np.where(status == 'late', EXPORT_FILLS['late'],
+                         np.where(status == 'overbreak', EXPORT_FILLS['overbreak'], None))
+        is_break = df['Action'].isin(break_actions).to_numpy()
+        is_halfday = df['Action'].isin(HALFDAY_ACTIONS).to_numpy()
+        is_attendance = ~is_break & ~is_halfday
+        if 'Attendance' in sheets:
+            _append_export_rows(sheets['Attendance'], df[is_attendance], fills[is_attendance])
+        if 'Breaks' in sheets:
+            _append_export_rows(sheets['Breaks'], df[is_break], fills[is_break])
+        if 'Halfday' in sheets:
+            # Half-day rows are not highlighted
+            _append_export_rows(sheets['Halfday'], df[is_halfday], [None] * int(is_halfday.sum()))
+        written += len(chunk)
+        if progress:
+            progress(written)
+    workbook.save(output)
+
+
+def export_filename(filters, timestamp):
+    """Builds the download name of an Excel export from its filters and a '%Y%m%d_%H%M%S' timestamp."""
+    period = '_'.join(value for value in (filters['start_date'], filters['end_date']) if value)
+    return f"attendance_report_{period + '_' if period else ''}{timestamp}.xlsx"
+
+
+def parse_export_filters(args):
+    """
+    Reads the export filters (from, to, group, employee, action_class) from request arguments.
+    Returns (filters, error message); filters holds the storage-level filters plus the action class.
+    """
+    start_date = args.get('from', '').strip() or None
+    end_date = args.get('to', '').strip() or None
+    for value in (start_date, end_date):
+        if value and not LOG_PARTITION_KEY.match(value):
+            return None, 'Dates must be in YYYY-MM-DD format.'
+    if start_date and end_date and start_date > end_date:
+        return None, "The 'from' date must not be after the 'to' date."
+    employee = args.get('employee', '').strip()
+    if employee and not employee.isdigit():
+        return None, 'Employee must be a numeric ID.'
+    action_class = args.get('action_class', '').strip().lower() or None
+    if action_class and action_class not in EXPORT_SHEETS:
+        return None, f"Action class must be one of: {', '.join(EXPORT_SHEETS)}."
+    # Break and half-day classes are pushed down as action sets; attendance is everything else
+    actions = None
+    if action_class == 'breaks':
+        actions = frozenset(export_break_actions())
+    elif action_class == 'halfday':
+        actions = frozenset(HALFDAY_ACTIONS)
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'employee_id': int(employee) if employee else None,
+        'group': args.get('group', '').strip().upper() or None,
+        'actions': actions,
+        'action_class': action_class,
+    }, None
 
-                # Apply formatting to 'Breaks' sheet (if needed)
-                if 'Status' in breaks_df.columns:
-                    apply_conditional_formatting(breaks_sheet, 'Status')
-                else:
-                    app.logger.error("'Status' column not found in the Breaks sheet.")
-                    flash("'Status' column is missing from the Breaks data.", 'danger')
-                    return redirect(url_for('report'))
-
-            # Seek to the beginning of the BytesIO buffer
-            output.seek(0)
-
-            # Generate a dynamic filename with the current date and time
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'attendance_report_{timestamp}.xlsx'
-
-            return send_file(
-                output,
-                download_name=filename,
-                as_attachment=True,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
+
+@app.route('/attendance/export')
+@login_required
+def export():
+    if storage.has_log():
+        filters, error = parse_export_filters(request.args)
+        if error:
+            flash(error, 'warning')
+            return redirect(url_for('report'))
+        try:
+            def build():
+                # Filters are pushed down into storage, so only the requested slice is read
+                records = iter_export_records(filters, newest_first=True)
+                # Create a BytesIO buffer to hold the Excel file in memory
+                output = BytesIO()
+                write_export_workbook(output, records, filters['action_class'])
+                return output.getvalue()
+
+            # The sheet split depends on the break list, so its version is part of the key
+            key = ('export', reference_data().version, tuple(sorted((k, str(v)) for k, v in filters.items())))
+            response = cached_response(key, build, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+            # Generate a dynamic filename with the requested period and the current date and time
+            filename = export_filename(filters, datetime.now().strftime('%Y%m%d_%H%M%S'))
+            response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+            return response
         except Exception as e:
             app.logger.error(f"Error exporting to Excel: {e}")
             flash('Failed to export attendance data.', 'danger')
@@ -1124,6 +4188,388 @@ def export():
     return redirect(url_for('report'))
 
 
+# Background export jobs.
+# An export job builds the workbook on a small thread pool and writes it to
+# EXPORT_JOB_DIR, where it can be downloaded until EXPORT_JOB_TTL expires.
+# Requests for the same filters at the same log generation share one job.
+# Expired jobs and their files are swept whenever a job is submitted, polled
+# or downloaded, and every EXPORT_JOB_SWEEP_INTERVAL seconds by a sweeper
+# thread. Downloads open the file under the jobs lock, so a sweep cannot
+# delete it between the expiry check and the download.
+class ExportJobs:
+    """Bounded pool of Excel export jobs with progress, coalescing and expiry."""
+
+    def __init__(self, job_dir, workers, ttl, sweep_interval):
+        self.job_dir = job_dir
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export-job')
+        self._lock = threading.Lock()
+        self._jobs = {}                   # job ID -> job state
+        self._by_key = {}                 # coalescing key -> job ID
+        self._thread = None
+
+    def submit(self, filters):
+        """Returns the ID of a job building the export for these filters, starting one if needed."""
+        key = (_log_generation, reference_data().version, tuple(sorted((k, str(v)) for k, v in filters.items())))
+        with self._lock:
+            self._sweep()
+            job_id = self._by_key.get(key)
+            if job_id is not None and self._jobs[job_id]['status'] != 'failed':
+                return job_id
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'key': key,
+                'status': 'queued',
+                'rows': 0,
+                'error': None,
+                'filename': export_filename(filters, datetime.now().strftime('%Y%m%d_%H%M%S')),
+                'path': os.path.join(self.job_dir, f'{job_id}.xlsx'),
+                'expires': None,
+            }
+            self._by_key[key] = job_id
+        self._executor.submit(self._run, job_id, filters)
+        self._ensure_started()
+        return job_id
+
+    def status(self, job_id):
+        """Returns a copy of the job's public state, or None if it is unknown or expired."""
+        with self._lock:
+            self._sweep()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {field: job[field] for field in ('id', 'status', 'rows', 'error', 'filename')}
+
+    def open(self, job_id):
+        """
+        Returns the finished workbook of a job as an open binary file, or None if it
+        is not finished yet. Raises LookupError if the job is unknown or expired.
+        """
+        with self._lock:
+            self._sweep()
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise LookupError(f"Export job {job_id} not found or expired.")
+            if job['status'] != 'done':
+                return None
+            return open(job['path'], 'rb')
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            self._jobs[job_id].update(changes)
+
+    def _run(self, job_id, filters):
+        self._update(job_id, status='running')
+        path = self._jobs[job_id]['path']
+        tmp_path = path + '.tmp'
+        try:
+            os.makedirs(self.job_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as output:
+                write_export_workbook(output, iter_export_records(filters, newest_first=True), filters['action_class'],
+                                      progress=lambda rows: self._update(job_id, rows=rows))
+            os.replace(tmp_path, path)
+            self._update(job_id, status='done', expires=monotonic() + self.ttl)
+            app.logger.info(f"Export job {job_id} finished.")
+        except Exception as e:
+            app.logger.error(f"Export job {job_id} failed: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._update(job_id, status='failed', error='Failed to export attendance data.', expires=monotonic() + self.ttl)
+
+    def _sweep(self):
+        # Caller holds self._lock
+        now = monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job['expires'] is not None and job['expires'] < now:
+                del self._jobs[job_id]
+                if self._by_key.get(job['key']) == job_id:
+                    del self._by_key[job['key']]
+                try:
+                    if os.path.exists(job['path']):
+                        os.remove(job['path'])
+                except OSError as e:
+                    app.logger.error(f"Error removing expired export {job['path']}: {e}")
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run_sweeper, name='export-job-sweeper', daemon=True)
+                    self._thread.start()
+
+    def _run_sweeper(self):
+        while True:
+            sleep(self.sweep_interval)
+            try:
+                with self._lock:
+                    self._sweep()
+            except Exception as e:
+                app.logger.error(f"Error sweeping export jobs: {e}")
+
+
+export_jobs = ExportJobs(EXPORT_JOB_DIR, EXPORT_JOB_WORKERS, EXPORT_JOB_TTL, EXPORT_JOB_SWEEP_INTERVAL)
+
+
+@app.route('/attendance/export_jobs', methods=['POST'])
+@login_required
+def submit_export_job():
+    filters, error = parse_export_filters(request.values)
+    if error:
+        return jsonify({'error': error}), 400
+    job_id = export_jobs.submit(filters)
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('export_job_status', job_id=job_id),
+        'download_url': url_for('download_export_job', job_id=job_id),
+    }), 202
+
+
+@app.route('/attendance/export_jobs/<job_id>')
+@login_required
+def export_job_status(job_id):
+    status = export_jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Export job not found or expired.'}), 404
+    return jsonify(status)
+
+
+@app.route('/attendance/export_jobs/<job_id>/download')
+@login_required
+def download_export_job(job_id):
+    status = export_jobs.status(job_id)
+    try:
+        workbook = export_jobs.open(job_id)
+    except LookupError:
+        abort(404)
+    if status is None or workbook is None:
+        flash('Export is not ready yet.', 'warning')
+        return redirect(url_for('report'))
+    return send_file(
+        workbook,
+        download_name=status['filename'],
+        as_attachment=True,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+# Streaming exports.
+# CSV and NDJSON extracts are generated chunk by chunk from the same filtered
+# storage reader as the Excel export and sent as they are produced, gzipped on
+# the fly when the client accepts it. Rows come in log order, oldest first.
+def iter_export_records(filters, newest_first=False):
+    """Yields log records matching parsed export filters, pushing all but the attendance class down to storage."""
+    records = storage.iter_log_records(
+        filters['start_date'], filters['end_date'], newest_first=newest_first,
+        employee_id=filters['employee_id'], group=filters['group'], actions=filters['actions'])
+    if filters['action_class'] != 'attendance':
+        return records
+    excluded = export_break_actions() | set(HALFDAY_ACTIONS)
+    return (record for record in records if record.get('Action') not in excluded)
+
+
+def _export_value(value):
+    return '' if value is None or (isinstance(value, float) and pd.isna(value)) else value
+
+
+def iter_csv_export(records):
+    header = io.StringIO()
+    csv.writer(header, quoting=csv.QUOTE_ALL).writerow(LOG_FIELDNAMES)
+    yield header.getvalue().encode('utf-8')
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, EXPORT_CHUNK_ROWS))
+        if not chunk:
+            break
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        writer.writerows([_export_value(record.get(field)) for field in LOG_FIELDNAMES] for record in chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson_export(records):
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, EXPORT_CHUNK_ROWS))
+        if not chunk:
+            break
+        lines = []
+        for record in chunk:
+            item = {}
+            for field in LOG_FIELDNAMES:
+                value = _export_value(record.get(field))
+                if field in ('ID', 'Employee ID', 'Consumed Seconds', 'Lateness Seconds') and str(value).isdigit():
+                    value = int(value)
+                item[field] = None if value == '' else value
+            lines.append(json.dumps(item, default=str))
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def streaming_export(fmt, mimetype):
+    filters, error = parse_export_filters(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    chunks = iter_csv_export if fmt == 'csv' else iter_ndjson_export
+    body = chunks(iter_export_records(filters)) if storage.has_log() else chunks([])
+    period = '_'.join(value for value in (filters['start_date'], filters['end_date']) if value)
+    filename = f"attendance_log{'_' + period if period else ''}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename={filename}', 'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        body = gzip_chunks(body)
+        headers['Content-Encoding'] = 'gzip'
+    return app.response_class(body, mimetype=mimetype, headers=headers)
+
+
+@app.route('/attendance/export.csv')
+@login_required
+def export_csv():
+    return streaming_export('csv', 'text/csv')
+
+
+@app.route('/attendance/export.ndjson')
+@login_required
+def export_ndjson():
+    return streaming_export('ndjson', 'application/x-ndjson')
+
+
+# Monthly payroll.
+# A month of the log is read once and reduced with group-bys: rows to
+# (employee, day), days to employees, and employees to their groups. An
+# employee is counted under the group of their latest record in the month.
+PAYROLL_EMPLOYEE_COLUMNS = ['Employee ID', 'Name', 'Group', 'Days Present', 'Total Hours', 'Average Hours',
+                            'Late Count', 'Late Minutes', 'Half Days', 'Overbreak Minutes']
+PAYROLL_GROUP_COLUMNS = ['Group', 'Employees', 'Days Present', 'Total Hours', 'Average Hours',
+                         'Late Count', 'Late Minutes', 'Half Days', 'Overbreak Minutes']
+PAYROLL_MONTH = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+
+def month_bounds(month):
+    """Returns the first and last 'YYYY-MM-DD' dates of a 'YYYY-MM' month."""
+    first = datetime.strptime(month, '%Y-%m').date()
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return first.isoformat(), last.isoformat()
+
+
+def _payroll_rates(frame):
+    """Fills the derived hour and minute columns from the summed second totals."""
+    hours = frame['worked_seconds'].to_numpy(dtype='float64') / 3600
+    days = frame['Days Present'].to_numpy(dtype='float64')
+    frame['Total Hours'] = hours.round(2)
+    frame['Average Hours'] = np.divide(hours, days, out=np.zeros_like(hours), where=days > 0).round(2)
+    frame['Late Minutes'] = (frame['late_seconds'].to_numpy(dtype='float64') / 60).round(1)
+    frame['Overbreak Minutes'] = (frame['overbreak_seconds'].to_numpy(dtype='float64') / 60).round(1)
+    return frame
+
+
+def payroll_report(month):
+    """Returns the (per-employee, per-group) payroll DataFrames of a 'YYYY-MM' month."""
+    start_date, end_date = month_bounds(month)
+    df = read_log_frame(start_date, end_date, LOG_METRIC_COLUMNS + ['Name', 'Group'])
+    employees = pd.DataFrame(columns=PAYROLL_EMPLOYEE_COLUMNS)
+    groups = pd.DataFrame(columns=PAYROLL_GROUP_COLUMNS)
+    if df.empty:
+        return employees, groups
+
+    metrics = log_metrics(df)
+    metrics['Name'] = df['Name'].astype(str).str.strip()
+    metrics['Group'] = df['Group'].astype(str).str.strip().str.upper()
+    metrics = metrics[metrics['Employee ID'].notna() & metrics['Date'].between(start_date, end_date)]
+    if metrics.empty:
+        return employees, groups
+    metrics['Employee ID'] = metrics['Employee ID'].astype('int64')
+
+    # A day counts once however many work or half-day rows it has
+    daily = metrics.groupby(['Employee ID', 'Date'], sort=False).agg(
+        worked_seconds=('worked_seconds', 'sum'), late_seconds=('late_seconds', 'sum'),
+        late_count=('late_count', 'sum'), overbreak_seconds=('overbreak_seconds', 'sum'),
+        present=('present', 'max'), halfday=('halfday', 'max'))
+    totals = daily.groupby(level='Employee ID').sum()
+    # Rows are in log order, so the last row of each employee carries their latest name and group
+    latest = metrics.groupby('Employee ID')[['Name', 'Group']].last()
+    employees = totals.join(latest).reset_index().rename(columns={
+        'present': 'Days Present', 'late_count': 'Late Count', 'halfday': 'Half Days'})
+    employees = _payroll_rates(employees).sort_values(['Group', 'Name', 'Employee ID'], kind='stable')
+
+    groups = employees.groupby('Group', sort=True).agg(
+        Employees=('Employee ID', 'size'), worked_seconds=('worked_seconds', 'sum'),
+        late_seconds=('late_seconds', 'sum'), overbreak_seconds=('overbreak_seconds', 'sum'),
+        **{'Days Present': ('Days Present', 'sum'), 'Late Count': ('Late Count', 'sum'),
+           'Half Days': ('Half Days', 'sum')}).reset_index()
+    groups = _payroll_rates(groups)
+    return employees[PAYROLL_EMPLOYEE_COLUMNS].reset_index(drop=True), groups[PAYROLL_GROUP_COLUMNS]
+
+
+def write_payroll_workbook(output, employees, groups):
+    """Writes the payroll DataFrames as 'By Employee' and 'By Group' sheets of a workbook."""
+    workbook = Workbook(write_only=True)
+    for title, frame in (('By Employee', employees), ('By Group', groups)):
+        sheet = workbook.create_sheet(title)
+        sheet.append(list(frame.columns))
+        for values in frame.itertuples(index=False, name=None):
+            sheet.append([value.item() if isinstance(value, np.generic) else value for value in values])
+    workbook.save(output)
+
+
+def requested_month():
+    """Returns the ?month=YYYY-MM argument (default: the current month) or None when it is malformed."""
+    month = request.args.get('month') or get_pakistan_time().strftime('%Y-%m')
+    return month if PAYROLL_MONTH.match(month) else None
+
+
+@app.route('/attendance/payroll')
+@login_required
+@admin_required
+def payroll():
+    month = requested_month()
+    if month is None:
+        flash('Month must be in YYYY-MM format.', 'warning')
+        return redirect(url_for('payroll'))
+    try:
+        employees, groups = payroll_report(month)
+    except Exception as e:
+        app.logger.error(f"Error building payroll for {month}: {e}")
+        flash('Failed to build the payroll report.', 'danger')
+        employees = pd.DataFrame(columns=PAYROLL_EMPLOYEE_COLUMNS)
+        groups = pd.DataFrame(columns=PAYROLL_GROUP_COLUMNS)
+    return render_template('payroll.html', month=month,
+                           employee_headers=PAYROLL_EMPLOYEE_COLUMNS, employee_rows=employees.values.tolist(),
+                           group_headers=PAYROLL_GROUP_COLUMNS, group_rows=groups.values.tolist())
+
+
+@app.route('/attendance/payroll/export')
+@login_required
+@admin_required
+def export_payroll():
+    month = requested_month()
+    if month is None:
+        flash('Month must be in YYYY-MM format.', 'warning')
+        return redirect(url_for('payroll'))
+    try:
+        def build():
+            output = BytesIO()
+            write_payroll_workbook(output, *payroll_report(month))
+            return output.getvalue()
+
+        response = cached_response(('payroll', month), build,
+                                   'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response.headers['Content-Disposition'] = f'attachment; filename=payroll_{month}.xlsx'
+        return response
+    except Exception as e:
+        app.logger.error(f"Error exporting payroll for {month}: {e}")
+        flash('Failed to export the payroll report.', 'danger')
+    return redirect(url_for('payroll', month=month))
+
+
 @app.route('/attendance/logout')
 @login_required
 def logout():
@@ -1150,6 +4596,54 @@ def change_key():
 
     return render_template('change_key.html')
 
+@app.route('/attendance/break_limits', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def break_limits():
+    if request.method == 'POST':
+        actions = request.form.getlist('action')
+        minutes = request.form.getlist('minutes')
+        limits = {}
+        for action, limit in zip(actions, minutes):
+            action = action.strip()
+            limit = limit.strip()
+            if not action or not limit:
+                continue  # A blank row removes the break
+            if not limit.isdigit() or int(limit) <= 0:
+                flash(f"Time limit for '{action}' must be a positive number of minutes.", 'warning')
+                return redirect(url_for('break_limits'))
+            limits[action] = int(limit)
+        try:
+            reference_registry.set_break_limits(limits)
+            flash('Break limits updated successfully.', 'success')
+        except Exception as e:
+            app.logger.error(f"Error updating break limits: {e}")
+            flash('Failed to update break limits.', 'danger')
+        return redirect(url_for('break_limits'))
+
+    return render_template('break_limits.html', time_limits=reference_data().time_limits)
+
+@app.route('/attendance/summary/<employee_id>')
+@login_required
+@admin_required
+def employee_summary(employee_id):
+    start_date = request.args.get('from') or None
+    end_date = request.args.get('to') or None
+    for value in (start_date, end_date):
+        if value and not LOG_PARTITION_KEY.match(value):
+            return jsonify({'error': 'Dates must be YYYY-MM-DD.'}), 400
+    employee = roster.get(employee_id)
+    if employee is None:
+        abort(404)
+    totals = get_employee_totals(employee_id, start_date, end_date)
+    return jsonify({'employee': employee, 'from': start_date, 'to': end_date, 'totals': totals})
+
+@app.route('/attendance/clock_status')
+@login_required
+@admin_required
+def clock_status():
+    return jsonify(clock.status())
+
 @app.route('/attendance/purge_duplicates', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -1180,52 +4674,24 @@ def add_employee():
             flash('Employee Name is required.', 'warning')
             return redirect(url_for('add_employee'))
 
-        # Read existing employees
-        employee_list = get_employee_list()
-
-        # Determine the next employee ID with leading zeros
-        if employee_list:
-            try:
-                # Extract existing IDs as integers
-                existing_ids = [int(emp['ID']) for emp in employee_list]
-                max_id = max(existing_ids)
-                new_id_int = max_id + 1
-                # Format the new_id as a four-digit string with leading zeros
-                new_id = f"{new_id_int:04}"
-            except ValueError:
-                flash('Existing employee IDs are not numeric. Cannot auto-increment.', 'danger')
-                return redirect(url_for('add_employee'))
-        else:
-            new_id = '0001'  # Start IDs at '0001' if no employees exist
-
-        # Append the new employee to employees.csv
+        # Append the new employee under the next four-digit ID
         try:
-            with open(EMPLOYEES_FILE, 'a', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['ID', 'Name']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                # Write header if the file is empty
-                if os.stat(EMPLOYEES_FILE).st_size == 0:
-                    writer.writeheader()
-                writer.writerow({'ID': new_id, 'Name': employee_name})
+            new_id = roster.add(employee_name)
             flash(f'Employee "{employee_name}" added successfully with ID {new_id}.', 'success')
+        except ValueError:
+            flash('Existing employee IDs are not numeric. Cannot auto-increment.', 'danger')
+            return redirect(url_for('add_employee'))
         except Exception as e:
             app.logger.error(f"Error adding employee: {e}")
             flash('Failed to add employee.', 'danger')
         return redirect(url_for('manage_employees'))
 
     # For GET requests, determine the next available ID with leading zeros
-    employee_list = get_employee_list()
-    if employee_list:
-        try:
-            existing_ids = [int(emp['ID']) for emp in employee_list]
-            max_id = max(existing_ids)
-            next_id_int = max_id + 1
-            next_id = f"{next_id_int:04}"
-        except ValueError:
-            next_id = 'N/A'
-            flash('Existing employee IDs are not numeric. Cannot auto-increment.', 'danger')
-    else:
-        next_id = '0001'
+    try:
+        next_id = roster.next_id()
+    except ValueError:
+        next_id = 'N/A'
+        flash('Existing employee IDs are not numeric. Cannot auto-increment.', 'danger')
 
     return render_template('add_employee.html', next_id=next_id)
 
@@ -1234,8 +4700,7 @@ def add_employee():
 @login_required
 @admin_required
 def edit_employee(employee_id):
-    employee_list = get_employee_list()
-    employee = next((emp for emp in employee_list if emp['ID'] == employee_id), None)
+    employee = roster.get(employee_id)
     if not employee:
         flash('Employee not found.', 'danger')
         return redirect(url_for('manage_employees'))
@@ -1246,18 +4711,9 @@ def edit_employee(employee_id):
             flash('Employee Name is required.', 'warning')
             return redirect(url_for('edit_employee', employee_id=employee_id))
 
-        # Update the employee in the list
-        for emp in employee_list:
-            if emp['ID'] == employee_id:
-                emp['Name'] = new_employee_name
-                break
-        # Write the updated list back to employees.csv
+        # Write the updated name through the roster cache
         try:
-            with open(EMPLOYEES_FILE, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['ID', 'Name']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(employee_list)
+            roster.rename(employee_id, new_employee_name)
             flash('Employee updated successfully.', 'success')
         except Exception as e:
             app.logger.error(f"Error updating employee: {e}")
@@ -1269,22 +4725,15 @@ def edit_employee(employee_id):
 @login_required
 @admin_required
 def delete_employee(employee_id):
-    employee_list = get_employee_list()
-    employee = next((emp for emp in employee_list if emp['ID'] == employee_id), None)
+    employee = roster.get(employee_id)
     if not employee:
         flash('Employee not found.', 'danger')
         return redirect(url_for('manage_employees'))
 
     if request.method == 'POST':
-        # Remove the employee from the list
-        employee_list = [emp for emp in employee_list if emp['ID'] != employee_id]
-        # Write the updated list back to employees.csv
+        # Remove the employee through the roster cache
         try:
-            with open(EMPLOYEES_FILE, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['ID', 'Name']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(employee_list)
+            roster.remove(employee_id)
             flash('Employee deleted successfully.', 'success')
         except Exception as e:
             app.logger.error(f"Error deleting employee: {e}")
@@ -1292,6 +4741,58 @@ def delete_employee(employee_id):
         return redirect(url_for('manage_employees'))
     return render_template('delete_employee.html', employee=employee)
 
+@app.cli.command('archive-log')
+@click.option('--before', default=None, help="Archive every month before this one (YYYY-MM); defaults to the current month.")
+def archive_log_command(before):
+    """Freezes closed-out months of the attendance log into the columnar archive."""
+    before = before or datetime.now(LOCAL_TIME_ZONE).strftime('%Y-%m')
+    if not re.match(r'^\d{4}-\d{2}$', before):
+        raise click.BadParameter('Expected YYYY-MM.', param_hint='--before')
+    if not hasattr(storage, 'partitions'):
+        raise click.ClickException(f"The {app.config['STORAGE_BACKEND']} backend does not support archiving.")
+    try:
+        acquire_instance_lock()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    with _log_write_lock:
+        months = sorted({key[:7] for key in storage.partitions() if key != UNDATED_PARTITION and key[:7] < before})
+        for month in months:
+            rows = storage.archive_month(month)
+            click.echo(f"Archived {rows} records for {month}.")
+    if not months:
+        click.echo('No closed months to archive.')
+
+
+@app.cli.command('migrate-durations')
+def migrate_durations_command():
+    """Back-fills the integer-second duration columns now instead of in the background."""
+    try:
+        acquire_instance_lock()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    rows = migrate_duration_seconds()
+    click.echo(f"Back-filled {rows} log rows." if rows else 'All log rows already have integer-second durations.')
+
+
+@app.cli.command('rescore-time-ins')
+@click.option('--from', 'start_date', default=None, help="First date to check (YYYY-MM-DD).")
+@click.option('--to', 'end_date', default=None, help="Last date to check (YYYY-MM-DD).")
+def rescore_time_ins_command(start_date, end_date):
+    """Re-scores Time-In records against the current shift rules and lists the ones that differ."""
+    df = read_log_frame(start_date, end_date, ['ID', 'Group', 'Action', 'Date', 'Start Time', 'Shift', 'Lateness Duration', 'Status'])
+    df = df[df['Action'].astype(str).str.lower().isin(['time_in', 'time_in/time_out'])].reset_index(drop=True)
+    if df.empty:
+        click.echo('No Time-In records to re-score.')
+        return
+    scored = reference_data().shift_rules.rescore(df['Group'], df['Start Time'])
+    recorded = df[['Shift', 'Lateness Duration', 'Status']].astype(str)
+    changed = (recorded != scored).any(axis=1)
+    for i in np.flatnonzero(changed.to_numpy()):
+        click.echo(f"{df.at[i, 'ID']} {df.at[i, 'Date']} {df.at[i, 'Start Time']} {df.at[i, 'Group']}: "
+                   f"{' / '.join(recorded.loc[i])} -> {' / '.join(scored.loc[i])}")
+    click.echo(f"{int(changed.sum())} of {len(df)} Time-In records differ from the current shift rules.")
+
+
 @app.errorhandler(403)
 def forbidden(e):
     return render_template('403.html'), 403
@@ -1305,6 +4806,34 @@ def internal_error(e):
     app.logger.error(f"Server Error: {e}")
     return render_template('500.html'), 500
 
+# Start-up.
+# Services that have to run without any traffic, such as the overbreak timers
+# of breaks left open across a restart, start when the module is loaded by the
+# process that serves requests. CLI commands other than `flask run` and the
+# watcher process of the debug reloader, which never serves, skip them.
+def _serves_requests():
+    """Returns True if this process is going to serve requests."""
+    if is_running_from_reloader():
+        return True
+    ctx = click.get_current_context(silent=True)
+    if ctx is not None:
+        if ctx.info_name != 'run':
+            return False
+        reload = ctx.params.get('reload')
+        return not (get_debug_flag() if reload is None else reload)
+    # Run as a script, app.run(debug=True) below serves from a reloader child process
+    return __name__ != '__main__'
+
+
+def start_background_services():
+    """Takes the instance lock, then loads the active break registry, arming its overbreak timers and starting its snapshots and sweeper."""
+    acquire_instance_lock()
+    active_breaks.load()
+
+
+if _serves_requests():
+    start_background_services()
+
 if __name__ == '__main__':
     # It's recommended to set debug to False in production
     app.run(debug=True, host='0.0.0.0', port=8003)